@@ -1,6 +1,15 @@
+import os
 import re
+import heapq
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from dependencies import pulp
 from lottery import *
+from compact_lottery import *
+from task_heap import *
+from games import *
+from payoff_store import *
 
 # ===
 # Agents Implementation:
@@ -14,63 +23,437 @@ class Agent:
     def __init__(self, name, lottery):
         self.name = name
         self.lottery = lottery
+    
+    def snapshot_state(self):
+        # The state of the agent apart from its lottery, for checkpoints.
+        state = dict(self.__dict__)
+        del state["lottery"]
+        return state
+    
+    def restore_state(self, state):
+        self.__dict__.update(state)
+    
+    def sense_many(self, lines):
+        """
+        Senses many observations at once, e.g. from an observation log
+        (any iterable of lines, such as an open file), one after the other.
+        """
+        for line in lines:
+            if line.isspace() or not line: continue
+            self.sense(line)
+        
+    @classmethod
+    def decide_many(cls, lotteries, max_workers=None, chunk_size=1000):
+        """
+        Decides on many independent lotteries (Lottery objects or their
+        text) at once. Lotteries are split into chunks that are spread
+        over a process pool; decisions are returned in the input order.
+        """
+        lotteries = list(lotteries)
+        chunks = [lotteries[i:i + chunk_size] for i in range(0, len(lotteries), chunk_size)]
+        if max_workers == 1 or len(chunks) <= 1:
+            results = map(cls.decide_chunk, chunks)
+        else:
+            with ProcessPoolExecutor(max_workers) as executor:
+                results = list(executor.map(cls.decide_chunk, chunks))
+        return [decision for chunk in results for decision in chunk]
+    
+    @classmethod
+    def decide_chunk(cls, lotteries):
+        decisions = []
+        for lottery in lotteries:
+            if isinstance(lottery, str): lottery = parse_lottery(lottery)
+            decisions.append(cls(cls.__name__, lottery).decide())
+        return decisions
         
         
 # Single Agent Decision:
         
+OUTCOME_NAME = r"[a-zA-Z]\w*(?:\|[a-zA-Z]\w*)*"
+OBSERVATION_RE = re.compile(r"\((-?\d+(?:\.\d+)?),(%s(?:\.%s)*)\)$" % (OUTCOME_NAME, OUTCOME_NAME))
+IGNORED_CHARS = str.maketrans("", "", " \t\n\r\f\v+")
+
+def parse_observation(line):
+    """
+    Parses an observation such as "(-5, A.win)" into (-5, "A.win").
+    """
+    match = OBSERVATION_RE.match(line.translate(IGNORED_CHARS))
+    if match is None:
+        raise ValueError("Invalid observation: %r" % line)
+    value = match.group(1)
+    return float(value) if "." in value else int(value), match.group(2)
+
 class RationalAgent(Agent):
     """
     Agent that decides rationaly.
+    
+    By default an observed value replaces the value of its outcome. Given
+    an estimator (a class from estimators.py, or any function returning
+    an estimator), every observed outcome gets its own, seeded with its
+    value and occurrences, which folds the values observed into its value,
+    occurrences and worst case instead.
     """
     
+    def __init__(self, name, lottery, estimator=None):
+        Agent.__init__(self, name, lottery)
+        self.estimator = estimator
+        self.observed = {}
+        self.observed_owner = lottery.owner
+        # The tasks are kept in a max-heap by pondered value, and only the
+        # tasks the change log of the lottery has since the last decision
+        # are updated, whoever changed them. seen is the change log, and
+        # its version, when the ranking was last updated.
+        self.ranking = None
+        self.seen = None
+        self.changed_tasks = set()
+    
+    def snapshot_state(self):
+        # The observed outcomes and the ranking are only caches.
+        state = Agent.snapshot_state(self)
+        for cache in ("observed", "observed_owner", "ranking", "seen", "changed_tasks"):
+            del state[cache]
+        return state
+    
+    def restore_state(self, state):
+        Agent.restore_state(self, state)
+        self.observed = {}
+        self.observed_owner = self.lottery.owner
+        self.ranking = None
+        self.seen = None
+        self.changed_tasks = set()
+    
     def decide(self):
         # Select the task with the highest pondered value.
-        task_values = self.lottery.calculate_pondered_values()
-        best_task = list(task_values)[0]
-        best_value = task_values[best_task]
-        for k in list(task_values)[1:]:
-            if task_values[k] > best_value:
-                best_task = k
-                best_value = task_values[k]
-        return best_task
+        self.update_ranking()
+        return self.ranking.peek()
+    
+    def top_k(self, k):
+        """
+        Returns the k tasks with the highest pondered values, as
+        (task, value) pairs, best first.
+        """
+        self.update_ranking()
+        return self.ranking.top_k(k)
+    
+    def update_ranking(self):
+        changes = self.lottery.changes
+        if self.ranking is None or self.seen is None or self.seen[0] is not changes:
+            self.ranking = TaskHeap(self.lottery.calculate_pondered_values())
+        else:
+            tasks = self.lottery.tasks
+            for task in changes.changed_since(self.seen[1]):
+                self.ranking.update(task, tasks[task].calculate_pondered_value())
+        self.seen = (changes, changes.version)
+        self.changed_tasks.clear()
+    
+    def what_if(self, scenarios):
+        """
+        Returns the task the agent would choose after each scenario (an
+        observation line, or a list of them), without changing the agent.
+        Each scenario is sensed by an agent on a fork of the lottery, so
+        only the outcomes it observes are copied, and only the tasks it
+        touches are ranked again against the ranking of this agent.
+        """
+        self.update_ranking()
+        order = self.ranking.order
+        decisions = []
+        for scenario in scenarios:
+            if isinstance(scenario, str): scenario = [scenario]
+            agent = RationalAgent(self.name, self.lottery.fork(), self.estimator)
+            agent.sense_many(scenario)
+            touched = agent.changed_tasks
+            best = None
+            for task, value in self.ranking.top_k(len(touched) + 1):
+                if task not in touched:
+                    best, best_key = task, (value, -order[task])
+                    break
+            for task in touched:
+                key = (agent.lottery.tasks[task].calculate_pondered_value(), -order[task])
+                if best is None or key > best_key:
+                    best, best_key = task, key
+            decisions.append(best)
+        return decisions
+    
+    @classmethod
+    def decide_chunk(cls, lotteries):
+        # Every lottery of the chunk is stacked into one compact lottery,
+        # which is evaluated in a single pass. That's only how an agent
+        # that decides like a RationalAgent decides, the others (e.g. on
+        # games) decide on each lottery.
+        if cls.decide is not RationalAgent.decide:
+            return super().decide_chunk(lotteries)
+        stacked = CompactLottery({})
+        tasks = []
+        for lottery in lotteries:
+            if isinstance(lottery, str): lottery = LotteryParser(lottery).parse()
+            tasks.append(stacked.append_tasks(lottery))
+        stacked.evaluate()
+        pondered = stacked.pondered
+        return [max(lottery_tasks, key=lambda task: pondered[task[1]])[0] for lottery_tasks in tasks]
     
     def sense(self, line):
-        line = re.sub(r"[\s+]", "", line) #trim whitespaces
-        match = re.match(r"\((?P<value>-?\d+(?:.\d+)?),(?P<outcome>[a-zA-z]\w*(?:\.[a-zA-Z]\w*)*)\)", line)
-        value = eval(match.group("value"))
-        outcome_ids = match.group("outcome").split('.')
-        self.update_observations(value, outcome_ids[0], outcome_ids[1:])
+        value, path = parse_observation(line)
+        self.observe(value, path)
         
+    def sense_many(self, lines):
+        """
+        Senses many observations at once, e.g. from an observation log
+        (any iterable of lines, such as an open file). Only the last value
+        seen for each outcome matters, so each outcome is updated once and
+        the task values are recomputed on the next decision. With an
+        estimator every value counts, so they are all observed in order.
+        """
+        updates = {}
+        for line in lines:
+            if line.isspace() or not line: continue
+            value, path = parse_observation(line)
+            if self.estimator is not None: self.observe(value, path)
+            else: updates[path] = value
+        for path in updates:
+            self.observe(updates[path], path)
+            
+    def observe(self, value, path):
+        # The outcome of every dotted path seen is remembered, so repeated
+        # observations don't walk the lottery again.
+        if self.observed_owner is not self.lottery.owner:
+            # The lottery was forked, so the outcomes seen may be shared.
+            self.observed = {}
+            self.observed_owner = self.lottery.owner
+        outcome = self.observed.get(path)
+        if outcome is None:
+            outcome_ids = path.split('.')
+            outcome = self.update_observations(value, outcome_ids[0], outcome_ids[1:])
+            self.observed[path] = outcome
+        else:
+            self.changed_tasks.add(path.split('.', 1)[0])
+            outcome.observe(value)
     
     def update_observations(self, value, task_name, outcome_list):
-        task = self.lottery.tasks[task_name]
-        if not outcome_list[0] in task.outcomes:
-            task.outcomes[outcome_list[0]] = Outcome(outcome_list[0], (1, 0))
-        outcome = task.outcomes[outcome_list[0]]
+        task = self.lottery.unshare_task(task_name)
+        self.changed_tasks.add(task_name)
+        new = not outcome_list[0] in task.outcomes
+        if new:
+            task.add_outcome(Outcome(outcome_list[0], (1, 0)))
+        outcome = task.unshare_outcome(outcome_list[0])
         
         for outcome_name in outcome_list[1:]:
-            if not outcome_name in outcome.children:
-                outcome.children[outcome_name] = Outcome(outcome_name, (1, 0))
-            outcome = outcome.children[outcome_name]
-        outcome.value = value  
+            new = not outcome_name in outcome.children
+            if new:
+                outcome.add_child(Outcome(outcome_name, (1, 0)))
+            outcome = outcome.unshare_child(outcome_name)
+        if self.estimator is not None and outcome.estimator is None:
+            # The estimator starts from what the outcome had before, unless
+            # it's new.
+            estimator = self.estimator()
+            if not new: estimator.seed(outcome.value, outcome.occurrences)
+            outcome.estimator = estimator
+        outcome.observe(value)
+        return outcome
+
+def format_mix(names, weights):
+    # Writes a mix of tasks or strategies as "(0.5,T0;0.5,T1)".
+    sol = "("
+    for name in names:
+        v = weights.get(name, 0)
+        if v > 0: sol += str(round(v,2)) +  "," + name + ";"
+    return sol[:-1] + ")"
+
+def distribute_effort(expected_reward, worst_case):
+    """
+    Solves  max c.x  s.t.  w.x >= 0, sum(x) = 1, 0 <= x <= 1  in process,
+    where c are the expected rewards and w the worst cases of the tasks.
+    Returns a task -> effort dict, or None when the problem is infeasible.
+    """
+    # The feasible mixes are the points of the convex hull of the (w, c)
+    # pairs with w >= 0, so the optimum is either a single task with w >= 0
+    # or the point where the upper hull crosses w = 0, which mixes two tasks.
+    best_task = None
+    for task in expected_reward:
+        if worst_case[task] >= 0 and (best_task is None or expected_reward[task] > expected_reward[best_task]):
+            best_task = task
+    if best_task is None:
+        return None
+    
+    hull = []
+    for task in sorted(expected_reward, key=lambda t: (worst_case[t], -expected_reward[t])):
+        if hull and worst_case[hull[-1]] == worst_case[task]:
+            continue # Only the best task of each worst case can be on the upper hull.
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            cross = (worst_case[b] - worst_case[a]) * (expected_reward[task] - expected_reward[a]) - \
+                    (expected_reward[b] - expected_reward[a]) * (worst_case[task] - worst_case[a])
+            if cross < 0: break
+            hull.pop()
+        hull.append(task)
+    
+    for a, b in zip(hull, hull[1:]):
+        wa, wb = worst_case[a], worst_case[b]
+        if wa < 0 < wb:
+            value = (expected_reward[a] * wb - expected_reward[b] * wa) / (wb - wa)
+            if value > expected_reward[best_task]:
+                return {a: wb / (wb - wa), b: -wa / (wb - wa)}
+            break
+    return {best_task: 1}
+
+class StableSolution:
+    """
+    An optimal effort distribution found by distribute_effort, with the
+    dual solution (lambda, mu) that proves it optimal: every task has
+    c + lambda * w <= mu, with equality for the tasks in the solution.
+    
+    The solution stays optimal while the coefficients of the tasks in it
+    don't change and every other task keeps c + lambda * w < mu, i.e. its
+    expected reward and worst case stay within their stability ranges.
+    Ties are never taken as stable, so that the result is the same as
+    solving again.
+    """
+    
+    def __init__(self, effort, expected_reward, worst_case, decision):
+        self.decision = decision
+        self.basis = {task: (expected_reward[task], worst_case[task]) for task in effort}
+        self.size = len(expected_reward)
+        self.valid = True
+        if len(effort) == 2:
+            (ca, wa), (cb, wb) = self.basis.values()
+            self.dual = (ca - cb) / (wb - wa)
+            self.bound = ca + self.dual * wa
+            self.valid = self.dual >= 0
+        elif list(self.basis.values())[0][1] > 0:
+            self.dual = 0
+            self.bound = list(self.basis.values())[0][0]
+        else:
+            self.valid = False # A degenerate solution, always solved again.
+        if self.valid:
+            self.valid = self.holds(expected_reward, worst_case)
+    
+    def is_stable(self, c, w):
+        slack = self.bound - c - self.dual * w
+        return slack > 1e-9 * (abs(self.bound) + abs(c) + abs(self.dual * w))
+    
+    def holds(self, expected_reward, worst_case):
+        if not self.valid or len(expected_reward) != self.size:
+            return False
+        for task in self.basis:
+            if (expected_reward.get(task), worst_case.get(task)) != self.basis[task]:
+                return False
+        for task in expected_reward:
+            if task not in self.basis and not self.is_stable(expected_reward[task], worst_case[task]):
+                return False
+        return True
+    
+    def holds_after(self, changed):
+        """
+        Like holds, when only the tasks of changed (a task -> (expected
+        reward, worst case) dict) changed since the solution last held.
+        """
+        if not self.valid:
+            return False
+        for task in changed:
+            if task in self.basis:
+                if changed[task] != self.basis[task]: return False
+            elif not self.is_stable(*changed[task]):
+                return False
+        return True
+    
+    def ranges(self, expected_reward, worst_case):
+        """
+        Returns, for each task outside the solution, the range of its
+        expected reward (given its worst case) and of its worst case
+        (given its expected reward) over which the solution stays optimal.
+        """
+        inf = float("inf")
+        ranges = {}
+        for task in expected_reward:
+            if task not in self.basis:
+                c, w = expected_reward[task], worst_case[task]
+                w_range = (-inf, (self.bound - c) / self.dual if self.dual > 0 else inf)
+                ranges[task] = ((-inf, self.bound - self.dual * w), w_range)
+        return ranges
 
 class SafeAgent(Agent):
     """
     Avoids having a negative reward and distributes its effort
     ammong many tasks.
+    
+    The last solution is kept (see StableSolution) and reused, without
+    solving, while the expected rewards and worst cases stay within its
+    stability ranges. hits and misses count how often that happens. Only
+    the tasks the change log of the lottery has since the last decision
+    are checked (see ChangeLog).
     """
     
+    def __init__(self, name, lottery, cache=True):
+        Agent.__init__(self, name, lottery)
+        self.cache = cache
+        self.solution = None
+        # The change log of the lottery, and its version, when the solution
+        # was last found to hold.
+        self.seen = None
+        self.hits = 0
+        self.misses = 0
+    
+    def snapshot_state(self):
+        # A restored lottery has a change log of its own.
+        state = Agent.snapshot_state(self)
+        del state["seen"]
+        return state
+    
+    def restore_state(self, state):
+        Agent.restore_state(self, state)
+        self.seen = None
+    
+    def hit_rate(self):
+        decisions = self.hits + self.misses
+        return self.hits / decisions if decisions else 0
+    
+    def stability_ranges(self):
+        if self.solution is None or not self.solution.valid:
+            return None
+        return self.solution.ranges(self.lottery.calculate_pondered_values(),
+                                    self.lottery.calculate_worst_cases())
+    
     def decide(self):
         # The agent distributes its effort ammong the tasks
         # avoiding the possibility of having a negative
         # reward. This equates to a linear programming
-        # problem that will be solved with PuLP, a Linear
-        # Programming solver for python.
+        # problem. It has a simple enough structure to be
+        # solved directly (see distribute_effort); PuLP, a
+        # Linear Programming solver for python, is only used
+        # when there's no feasible distribution.
         
-        problem = pulp.LpProblem("DistributeEffort", pulp.LpMaximize)
+        changes = self.lottery.changes
+        if self.solution is not None and self.seen is not None and self.seen[0] is changes:
+            tasks = self.lottery.tasks
+            changed = {}
+            for task in changes.changed_since(self.seen[1]):
+                changed[task] = (tasks[task].calculate_pondered_value(), tasks[task].calculate_worst_case())
+            if self.solution.holds_after(changed):
+                self.seen = (changes, changes.version)
+                self.hits += 1
+                return self.solution.decision
         
         expected_reward = self.lottery.calculate_pondered_values()
         worst_case = self.lottery.calculate_worst_cases()
+        self.seen = (changes, changes.version)
+        if self.solution is not None and self.solution.holds(expected_reward, worst_case):
+            self.hits += 1
+            return self.solution.decision
+        self.misses += 1
+        
+        effort = distribute_effort(expected_reward, worst_case)
+        solved_directly = effort is not None
+        if effort is None:
+            effort = self.solve_with_pulp(expected_reward, worst_case)
+        
+        sol = format_mix(self.lottery.tasks, effort)
+        if self.cache and solved_directly:
+            self.solution = StableSolution(effort, expected_reward, worst_case, sol)
+        else:
+            self.solution = None
+        return sol
+    
+    def solve_with_pulp(self, expected_reward, worst_case):
+        problem = pulp.LpProblem("DistributeEffort", pulp.LpMaximize)
         problem_info = {}
         obj = {}
         non_negative = {}
@@ -88,23 +471,459 @@ class SafeAgent(Agent):
         problem += obj_func
         problem.solve()
         
-        sol = "("
-        for x in [x[0] for x in problem_info.values()]:
-            v = pulp.value(x)
-            if v > 0: sol += str(round(v,2)) +  "," + x.name + ";"
-        sol = sol[:-1] + ")"
-        return sol
+        return {task: pulp.value(problem_info[task][0]) for task in problem_info}
     
     def sense(self, line):
         pass # This one doesn't learn, so it does not need to sense.
 
 # Multi Agent Decision:
 
-class ConditionalAgent(Agent):
-    pass
+class GameAgent(RationalAgent):
+    """
+    A base class for agents playing a game against other agents. The game
+    is a lottery with a task per player, e.g.
+    
+        (mine=[T0|T0=(1,3), T0|T1=(1,0), T1|T0=(1,5), T1|T1=(1,1)],
+         peer=[T0|T0=(1,3), T0|T1=(1,5), T1|T0=(1,0), T1|T1=(1,1)])
+    
+    whose outcomes are the payoffs of the player, named by the strategy of
+    every player (in the order of the tasks) separated by "|". The agent
+    is the first player. A payoff is the value of its outcome (see
+    outcome_payoff), or 0 if it's missing, and observations such as
+    "(4, mine.T0|T1)" change it like they change an outcome for a
+    RationalAgent.
+    
+    The payoffs are kept in a payoff store (see payoff_store.py), written
+    from the lottery and then changed in place as payoffs are observed,
+    new strategies being added to it. It's written again for a new player,
+    or once the payoffs added in memory outnumber those of the file.
+    
+    Instead of a lottery, the agent can be given the path of an existing
+    payoff store, which it reads the game from. Its lottery then only has
+    the payoffs observed, which start from those of the store, and the
+    first payoff of each player, so that it has a task per player. The
+    file is never changed, and a new player is an error.
+    """
+    
+    def __init__(self, name, lottery, estimator=None):
+        self.store = None
+        if isinstance(lottery, str):
+            self.store = lottery
+            lottery = Lottery(first_payoffs(lottery))
+        RationalAgent.__init__(self, name, lottery, estimator)
+        self.players = None
+        self.strategies = None
+        self.index = None
+        self.payoffs = None
+        self.changed_payoffs = set()
+    
+    def snapshot_state(self):
+        # The payoffs are only a cache of the lottery.
+        state = RationalAgent.snapshot_state(self)
+        for cache in ("players", "strategies", "index", "payoffs", "changed_payoffs"):
+            del state[cache]
+        return state
+    
+    def restore_state(self, state):
+        RationalAgent.restore_state(self, state)
+        self.players = None
+        self.strategies = None
+        self.index = None
+        self.payoffs = None
+        self.changed_payoffs = set()
+    
+    def observe(self, value, path):
+        if self.store is not None: self.add_stored_payoff(path)
+        RationalAgent.observe(self, value, path)
+        self.changed_payoffs.add(tuple(path.split('.', 2)[:2]))
+    
+    def add_stored_payoff(self, path):
+        # A payoff of the file of a game read from a store is added to the
+        # lottery the first time it's observed, as the file has it.
+        player, _, rest = path.partition(".")
+        profile = rest.split(".", 1)[0]
+        task = self.lottery.tasks.get(player)
+        if task is None or profile in task.outcomes:
+            return
+        # The payoffs observed since the last update aren't of the file, so
+        # the game isn't updated, which is left to the next decision.
+        if self.payoffs is None: self.build_game()
+        index = self.profile_index(profile)
+        if index is not None and self.payoffs.position(index) is not None:
+            payoff = self.payoffs.payoff(self.players.index(player), index)
+            self.lottery.unshare_task(player).add_outcome(Outcome(profile, (1, payoff)))
+    
+    def update_game(self):
+        """
+        Builds the payoff store of the game, or updates the payoffs
+        observed since. Returns True if the game changed.
+        """
+        self.changed_tasks.clear() # The ranking of tasks isn't used.
+        changed = self.payoffs is None or len(self.changed_payoffs) > 0
+        build = self.payoffs is None
+        if not build:
+            for player, profile in self.changed_payoffs:
+                if not self.update_payoff(player, profile):
+                    build = True
+                    break
+            # The payoffs added in memory slow lines down, so the store is
+            # written again once they outnumber the others (unless it's
+            # the agent's, which only has the payoffs observed).
+            build = build or self.store is None and len(self.payoffs.added) > self.payoffs.entries
+        self.changed_payoffs.clear()
+        if build:
+            self.build_game()
+        return changed
+    
+    def build_game(self):
+        if self.payoffs is not None:
+            self.payoffs.close()
+        if self.store is not None:
+            self.payoffs = PayoffStore(self.store, writable=True)
+        else:
+            # The store is only kept as a private map, the file is removed
+            # once it's open.
+            handle, path = tempfile.mkstemp(suffix=".pays")
+            os.close(handle)
+            try:
+                write_game(self.lottery, path)
+                self.payoffs = PayoffStore(path, writable=True)
+            finally:
+                os.remove(path)
+        self.players = self.payoffs.players
+        self.strategies = self.payoffs.strategies
+        self.index = [{name: k for k, name in enumerate(strategies)} for strategies in self.strategies]
+        if self.store is not None:
+            # The payoffs observed, over those of the file.
+            tasks = self.lottery.tasks
+            for player in tasks:
+                for profile in tasks[player].outcomes:
+                    if not GameAgent.update_payoff(self, player, profile):
+                        raise ValueError("%s.%s is not a payoff of the game in %s" % (player, profile, self.store))
+    
+    def profile_index(self, profile):
+        names = profile.split("|")
+        if len(names) != len(self.players):
+            return None
+        index = []
+        for k in range(len(names)):
+            if names[k] not in self.index[k]: return None
+            index.append(self.index[k][names[k]])
+        return index
+    
+    def update_payoff(self, player, profile):
+        # Returns False if the payoff isn't one of the game, which must be
+        # built again: a new player's, or not a profile.
+        names = profile.split("|")
+        if player not in self.players or len(names) != len(self.players):
+            return False
+        for k in range(len(names)):
+            if names[k] not in self.index[k]: self.add_strategy(k, names[k])
+        outcome = self.lottery.tasks[player].outcomes[profile]
+        self.payoffs.set_payoff(self.players.index(player), self.profile_index(profile), outcome_payoff(outcome))
+        return True
+    
+    def add_strategy(self, player, name):
+        self.index[player][name] = len(self.strategies[player])
+        self.payoffs.add_strategy(player, name)
 
-class NashAgent(Agent):
-    pass
+class ConditionalAgent(GameAgent):
+    """
+    Chooses the task with the highest expected value given what the other
+    players do. The game is a lottery like a GameAgent's, where the agent
+    is the first player and its tasks are its strategies.
+    
+    Every payoff of the agent sensed, e.g. "(4, mine.T0|R1)", tells what
+    the others played (R1), so the agent counts how often each profile of
+    the other players' actions is seen and expects from a task
+    
+        E[task] = sum(count[profile] * payoff(task, profile)) / total
+    
+    with the payoffs of every task against a profile read from the payoff
+    store of the game as one line. The sums of every task are kept up to
+    date as observations come, so deciding takes time independent of how
+    much was sensed. Only the max_profiles most frequent profiles are kept:
+    a new one replaces the least frequent, and inherits its count (the
+    Space-Saving algorithm), so any profile seen more often than once every
+    max_profiles observations is never lost.
+    
+    Every profile in the lottery (or, for a game read from a payoff store,
+    every profile of the others) starts with a count of one, so before
+    anything is sensed each is expected as likely.
+    
+    The payoffs of a profile that isn't one of the game (with a strategy
+    of another player the lottery doesn't have) aren't added to the
+    lottery: the agent keeps their outcomes in extra only while the
+    profile is in the table, so memory stays bounded however many
+    profiles are sensed. The other players' payoffs for such profiles
+    aren't used, and are ignored.
+    """
+    
+    def __init__(self, name, lottery, estimator=None, max_profiles=1000):
+        GameAgent.__init__(self, name, lottery, estimator)
+        self.max_profiles = max_profiles
+        self.player = next(iter(self.lottery.tasks))
+        self.tasks = []
+        self.table = {} # profile -> {task: payoff}
+        self.counts = {}
+        self.by_count = [] # A heap of (count, profile), to find the least.
+        self.sums = {}
+        self.total = 0
+        self.extra = {} # profile -> {task: Outcome}, for profiles new to the game
+        self.update_game()
+        self.add_tasks()
+        if self.store is None:
+            outcomes = self.lottery.tasks[self.player].outcomes
+            profiles = dict.fromkeys(profile.partition("|")[2] for profile in outcomes)
+        else:
+            profiles = map("|".join, itertools.product(*self.strategies[1:]))
+        for profile in profiles:
+            self.count(profile)
+    
+    def add_task(self, task):
+        if task not in self.sums:
+            self.tasks.append(task)
+            self.sums[task] = 0
+            for profile in self.table:
+                payoff = self.payoff(task, profile)
+                self.table[profile][task] = payoff
+                self.sums[task] += self.counts[profile] * payoff
+    
+    def add_tasks(self):
+        # The strategies of the agent that aren't tasks yet, which the game
+        # has when it's built again.
+        for task in self.strategies[0]:
+            self.add_task(task)
+    
+    def in_game(self, profile):
+        # True if every strategy of the profile of the others is one of the
+        # game's.
+        names = profile.split("|") if profile else []
+        if len(names) != len(self.players) - 1:
+            raise ValueError("%s is not a profile of the other players" % profile)
+        return all(names[k] in self.index[k + 1] for k in range(len(names)))
+    
+    def strategy_profile(self, task, profile):
+        # The profile of a game of one player is empty.
+        return task + "|" + profile if profile else task
+    
+    def payoff(self, task, profile):
+        if profile in self.extra or not self.in_game(profile):
+            outcome = self.extra.get(profile, {}).get(task)
+            return outcome_payoff(outcome) if outcome is not None else 0
+        index = self.profile_index(self.strategy_profile(task, profile))
+        return self.payoffs.payoff(0, index) if index is not None else 0
+    
+    def line(self, profile):
+        # The payoffs of every task against a profile of the others.
+        if profile in self.extra or not self.in_game(profile):
+            return {task: self.payoff(task, profile) for task in self.tasks}
+        index = self.profile_index(self.strategy_profile(self.strategies[0][0], profile))
+        line = self.payoffs.line(0, 0, index)
+        strategies = self.index[0]
+        return {task: line[strategies[task]] if task in strategies else 0 for task in self.tasks}
+    
+    def decide(self):
+        return max(self.tasks, key=self.sums.__getitem__)
+    
+    def sense_many(self, lines):
+        # Every observation counts a profile, so none can be skipped.
+        Agent.sense_many(self, lines)
+    
+    def observe(self, value, path):
+        player, _, rest = path.partition(".")
+        names = rest.split(".")
+        task, _, profile = names[0].partition("|")
+        self.update_game()
+        if not self.in_game(profile):
+            if player == self.player: self.observe_extra(value, task, profile, names)
+            return
+        GameAgent.observe(self, value, path)
+        if player != self.player:
+            return
+        self.update_game()
+        self.add_tasks()
+        self.count(profile)
+        self.update_sums(task, profile)
+    
+    def observe_extra(self, value, task, profile, names):
+        # Observes the outcome of a profile new to the game, kept in extra
+        # like update_observations keeps it in the lottery.
+        self.add_task(task)
+        self.count(profile)
+        outcomes = self.extra.setdefault(profile, {})
+        if task not in outcomes:
+            outcomes[task] = Outcome(names[0], (1, 0))
+        outcome = outcomes[task]
+        for name in names[1:]:
+            if name not in outcome.children:
+                outcome.add_child(Outcome(name, (1, 0)))
+            outcome = outcome.children[name]
+        if self.estimator is not None and outcome.estimator is None:
+            outcome.estimator = self.estimator()
+        outcome.observe(value)
+        self.update_sums(task, profile)
+    
+    def update_sums(self, task, profile):
+        old = self.table[profile][task]
+        new = self.table[profile][task] = self.payoff(task, profile)
+        self.sums[task] += self.counts[profile] * (new - old)
+    
+    def count(self, profile):
+        if profile not in self.table:
+            count = 0
+            if len(self.table) >= self.max_profiles:
+                count = self.evict()
+            self.table[profile] = self.line(profile)
+            self.counts[profile] = count
+            for task in self.tasks:
+                self.sums[task] += count * self.table[profile][task]
+        payoffs = self.table[profile]
+        for task in self.tasks:
+            self.sums[task] += payoffs[task]
+        self.counts[profile] += 1
+        self.total += 1
+        heapq.heappush(self.by_count, (self.counts[profile], profile))
+        if len(self.by_count) > 2 * self.max_profiles + 16:
+            # Drop the outdated entries, so the heap stays bounded too.
+            self.by_count = [(count, profile) for profile, count in self.counts.items()]
+            heapq.heapify(self.by_count)
+    
+    def evict(self):
+        # Removes the least frequent profile and returns its count.
+        while True:
+            count, profile = heapq.heappop(self.by_count)
+            if self.counts.get(profile) == count:
+                break
+        for task in self.tasks:
+            self.sums[task] -= count * self.table[profile][task]
+        del self.table[profile]
+        del self.counts[profile]
+        self.extra.pop(profile, None)
+        return count
+
+class NashAgent(GameAgent):
+    """
+    Plays a Nash equilibrium of a two player game, found with the
+    Lemke-Howson algorithm (see games.py). Deciding returns the mixed
+    strategy of the agent.
+    
+    When the payoffs change, the supports of the last equilibrium are
+    tried first (see support_equilibrium): while they still hold an
+    equilibrium, it's found in O(k^3 + mn) for supports of k strategies,
+    without pivoting. warm_starts counts how often that happens.
+    
+    Otherwise the strictly (or, if weak, weakly) dominated strategies are
+    removed first (see eliminate_dominated), and the reduced game solved.
+    """
+    
+    def __init__(self, name, lottery, estimator=None, weak=False):
+        GameAgent.__init__(self, name, lottery, estimator)
+        self.weak = weak
+        self.game = None
+        self.equilibrium = None
+        self.reduction = None
+        self.warm_starts = 0
+    
+    def snapshot_state(self):
+        state = GameAgent.snapshot_state(self)
+        del state["game"]
+        del state["reduction"]
+        return state
+    
+    def restore_state(self, state):
+        GameAgent.restore_state(self, state)
+        self.game = None
+        self.reduction = None
+    
+    def build_game(self):
+        GameAgent.build_game(self)
+        if len(self.players) != 2:
+            raise ValueError("A NashAgent plays two player games")
+        self.game = self.payoffs.bimatrix()
+        self.equilibrium = None
+    
+    def decide(self):
+        if self.update_game() or self.equilibrium is None:
+            self.equilibrium = self.solve()
+        x = self.equilibrium[0]
+        return format_mix(self.strategies[0], dict(zip(self.strategies[0], x)))
+    
+    def solve(self):
+        if self.equilibrium is not None:
+            x, y = self.equilibrium
+            equilibrium = support_equilibrium(self.game, support(x), support(y))
+            if equilibrium is not None:
+                self.warm_starts += 1
+                return equilibrium
+        self.reduction = eliminate_dominated(self.game, self.weak)
+        x, y = lemke_howson(self.reduction.reduced())
+        return self.reduction.expand(x, 0), self.reduction.expand(y, 1)
 
-class MixedAgent(Agent):
-    pass
+class MixedAgent(GameAgent):
+    """
+    Plays the optimal mixed strategy of a two player zero-sum game, which
+    guarantees it the value of the game whatever the other player does.
+    Only the payoffs of the agent are used, the other player's being taken
+    as their opposites.
+    
+    The strictly (or, if weak, weakly) dominated strategies are removed
+    first (see eliminate_dominated), and the minimax LP of the reduced game
+    is solved in process (see MinimaxLP) and kept between decisions. A
+    payoff observed only updates the LP, and the next decision starts from
+    the last optimal basis, unless it undoes a removal, which reduces the
+    game again.
+    """
+    
+    def __init__(self, name, lottery, estimator=None, weak=False):
+        GameAgent.__init__(self, name, lottery, estimator)
+        self.weak = weak
+        self.game = None
+        self.reduction = None
+        self.lp = None
+        self.strategy = None
+    
+    def snapshot_state(self):
+        state = GameAgent.snapshot_state(self)
+        del state["game"]
+        del state["reduction"]
+        del state["lp"]
+        return state
+    
+    def restore_state(self, state):
+        GameAgent.restore_state(self, state)
+        self.game = None
+        self.reduction = None
+        self.lp = None
+    
+    def build_game(self):
+        GameAgent.build_game(self)
+        if len(self.players) != 2:
+            raise ValueError("A MixedAgent plays two player games")
+        self.game = self.payoffs.bimatrix(zero_sum=True)
+        self.lp = None
+        self.strategy = None
+    
+    def add_strategy(self, player, name):
+        GameAgent.add_strategy(self, player, name)
+        self.lp = None
+    
+    def update_payoff(self, player, profile):
+        if not GameAgent.update_payoff(self, player, profile):
+            return False
+        if player == self.players[0] and self.lp is not None:
+            i, j = self.profile_index(profile)
+            reduction = self.reduction
+            if not reduction.holds(i, j):
+                self.lp = None
+            elif i in reduction.row_index and j in reduction.col_index:
+                self.lp.set_payoff(reduction.row_index[i], reduction.col_index[j], self.payoffs.payoff(0, (i, j)))
+        return True
+    
+    def decide(self):
+        if self.update_game() or self.strategy is None:
+            if self.lp is None:
+                self.reduction = eliminate_dominated(self.game, self.weak)
+                self.lp = MinimaxLP(self.reduction.reduce(0))
+            self.strategy = self.reduction.expand(self.lp.solve()[0], 0)
+        return format_mix(self.strategies[0], dict(zip(self.strategies[0], self.strategy)))
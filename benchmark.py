@@ -0,0 +1,708 @@
+import re
+import io
+import sys
+import time
+import random
+from lottery import *
+
+# ===
+# Benchmarks:
+# ===
+
+def random_outcomes(rng, n_outcomes, depth):
+    parts = []
+    for i in range(n_outcomes):
+        weight = rng.choice(["%d%%" % rng.randint(1, 99), str(rng.randint(1, 9))])
+        if depth > 0 and rng.random() < 0.3:
+            content = "[" + random_outcomes(rng, n_outcomes, depth - 1) + "]"
+        else:
+            content = str(rng.randint(-100, 100))
+        parts.append("o%d=(%s,%s)" % (i, weight, content))
+    return ",".join(parts)
+
+def random_lottery(n_tasks, n_outcomes=4, depth=2, seed=0):
+    """
+    Generates the text of a random lottery.
+    """
+    rng = random.Random(seed)
+    tasks = ["T%d=[%s]" % (t, random_outcomes(rng, n_outcomes, depth)) for t in range(n_tasks)]
+    return "(" + ", ".join(tasks) + ")"
+
+def random_game(n_strategies, seed=0):
+    """
+    Generates the text of a random two player game, for a GameAgent.
+    """
+    rng = random.Random(seed)
+    players = []
+    for player in ("mine", "peer"):
+        payoffs = ["S%d|R%d=(1,%d)" % (i, j, rng.randint(0, 1000))
+                   for i in range(n_strategies) for j in range(n_strategies)]
+        players.append("%s=[%s]" % (player, ", ".join(payoffs)))
+    return "(" + ", ".join(players) + ")"
+
+def random_game_observations(n_strategies, count=1000, seed=0, players=("mine", "peer")):
+    rng = random.Random(seed)
+    return ["(%d, %s.S%d|R%d)" % (rng.randint(0, 1000), rng.choice(players),
+                                  rng.randrange(n_strategies), rng.randrange(n_strategies))
+            for _ in range(count)]
+
+def measure(f, *args, repeat=3):
+    # Best wall clock time of a few runs, in seconds.
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def random_problem(n_vars, n_constraints, density=0.1, seed=0):
+    """
+    Generates a random feasible LpProblem (a packing LP).
+    """
+    from dependencies import pulp
+    rng = random.Random(seed)
+    problem = pulp.LpProblem("Random", pulp.LpMaximize)
+    xs = [pulp.LpVariable("x%d" % i, 0, 1) for i in range(n_vars)]
+    for j in range(n_constraints):
+        coeffs = [(x, rng.randint(1, 10)) for x in xs if rng.random() < density]
+        if coeffs:
+            problem += pulp.LpAffineExpression(coeffs) <= rng.randint(10, 100), "c%d" % j
+    problem += pulp.LpAffineExpression([(x, rng.randint(1, 10)) for x in xs])
+    return problem
+
+def legacy_parse_lottery(s):
+    # The original regex + eval parser, kept as a baseline.
+    prepared_s = re.sub(r"[\s+]", "", s)
+    prepared_s = "{" + prepared_s[1:-1] + "}"
+    prepared_s = re.sub(r"\[", "{", prepared_s)
+    prepared_s = re.sub(r"\]", "}", prepared_s)
+    prepared_s = re.sub(r"\=", ":", prepared_s)
+    prepared_s = re.sub(r"[a-zA-Z]\w*(\|[a-zA-Z]\w*)*", lambda m: "\"" + m.group() + "\"", prepared_s)
+    prepared_s = re.sub(r"\d+(\.\d+)?%", lambda m: str(float(m.group()[:-1]) / 100), prepared_s)
+    structure = eval(prepared_s)
+    return Lottery(structure)
+
+def legacy_normalised_names(self):
+    constraintsNames = {}
+    i = 0
+    for k in self.constraints:
+        constraintsNames[k] = "C%07d" % i
+        i += 1
+    variablesNames = {}
+    i = 0
+    for k in self.variables():
+        variablesNames[k.name] = "X%07d" % i
+        i += 1
+    return constraintsNames, variablesNames, "OBJ"
+
+def legacy_write_mps(self, filename, mpsSense = 0, rename = 0, mip = 1):
+    # The original LpProblem.writeMPS, kept as a baseline.
+    from dependencies.pulp.pulp import LpSenses, LpConstraintLE, LpConstraintEQ, LpConstraintGE, LpInteger
+    wasNone, dummyVar = self.fixObjective()
+    f = open(filename, "w")
+    if mpsSense == 0: mpsSense = self.sense
+    cobj = self.objective
+    if mpsSense != self.sense:
+        n = cobj.name
+        cobj = - cobj
+        cobj.name = n
+    if rename:
+        constraintsNames, variablesNames, cobj.name = legacy_normalised_names(self)
+    f.write("*SENSE:"+LpSenses[mpsSense]+"\n")
+    n = self.name
+    if rename: n = "MODEL"
+    f.write("NAME          "+n+"\n")
+    vs = self.variables()
+    # constraints
+    f.write("ROWS\n")
+    objName = cobj.name
+    if not objName: objName = "OBJ"
+    f.write(" N  %s\n" % objName)
+    mpsConstraintType = {LpConstraintLE:"L", LpConstraintEQ:"E", LpConstraintGE:"G"}
+    for k,c in self.constraints.items():
+        if rename: k = constraintsNames[k]
+        f.write(" "+mpsConstraintType[c.sense]+"  "+k+"\n")
+    # matrix
+    f.write("COLUMNS\n")
+    # Creation of a dict of dict:
+    # coefs[nomVariable][nomContrainte] = coefficient
+    coefs = {}
+    for k,c in self.constraints.items():
+        if rename: k = constraintsNames[k]
+        for v in c:
+            n = v.name
+            if rename: n = variablesNames[n]
+            if n in coefs:
+                coefs[n][k] = c[v]
+            else:
+                coefs[n] = {k:c[v]}
+
+    for v in vs:
+        if mip and v.cat == LpInteger:
+            f.write("    MARK      'MARKER'                 'INTORG'\n")
+        n = v.name
+        if rename: n = variablesNames[n]
+        if n in coefs:
+            cv = coefs[n]
+            # Most of the work is done here
+            for k in cv: f.write("    %-8s  %-8s  % .12e\n" % (n,k,cv[k]))
+
+        # objective function
+        if v in cobj: f.write("    %-8s  %-8s  % .12e\n" % (n,objName,cobj[v]))
+        if mip and v.cat == LpInteger:
+            f.write("    MARK      'MARKER'                 'INTEND'\n")
+    # right hand side
+    f.write("RHS\n")
+    for k,c in self.constraints.items():
+        c = -c.constant
+        if rename: k = constraintsNames[k]
+        if c == 0: c = 0
+        f.write("    RHS       %-8s  % .12e\n" % (k,c))
+    # bounds
+    f.write("BOUNDS\n")
+    for v in vs:
+        n = v.name
+        if rename: n = variablesNames[n]
+        if v.lowBound != None and v.lowBound == v.upBound:
+            f.write(" FX BND       %-8s  % .12e\n" % (n, v.lowBound))
+        elif v.lowBound == 0 and v.upBound == 1 and mip and v.cat == LpInteger:
+            f.write(" BV BND       %-8s\n" % n)
+        else:
+            if v.lowBound != None:
+                # In MPS files, variables with no bounds (i.e. >= 0)
+                # are assumed BV by COIN and CPLEX.
+                # So we explicitly write a 0 lower bound in this case.
+                if v.lowBound != 0 or (mip and v.cat == LpInteger and v.upBound == None):
+                    f.write(" LO BND       %-8s  % .12e\n" % (n, v.lowBound))
+            else:
+                if v.upBound != None:
+                    f.write(" MI BND       %-8s\n" % n)
+                else:
+                    f.write(" FR BND       %-8s\n" % n)
+            if v.upBound != None:
+                f.write(" UP BND       %-8s  % .12e\n" % (n, v.upBound))
+    f.write("ENDATA\n")
+    f.close()
+    self.restoreObjective(wasNone, dummyVar)
+    # returns the variables, in writing order
+    if rename == 0:
+        return vs
+    else:
+        return vs, variablesNames, constraintsNames, cobj.name
+
+def bench_parse():
+    print("parse_lottery throughput (MB/s)")
+    print("%10s %10s %10s %10s" % ("tasks", "size", "legacy", "parser"))
+    for n_tasks in (100, 1000, 10000):
+        text = random_lottery(n_tasks)
+        mb = len(text) / 1e6
+        legacy = measure(legacy_parse_lottery, text)
+        parser = measure(lambda: parse_lottery(io.StringIO(text)))
+        print("%10d %9.2fM %10.2f %10.2f" % (n_tasks, mb, mb / legacy, mb / parser))
+
+def bench_batch():
+    from agents import RationalAgent
+    print("RationalAgent decisions per second")
+    print("%10s %10s %10s %10s" % ("lotteries", "decide", "batch", "batch x4"))
+    for n in (1000, 10000):
+        texts = [random_lottery(10, seed=i) for i in range(n)]
+        single = measure(lambda: [RationalAgent("r", parse_lottery(t)).decide() for t in texts], repeat=1)
+        batch = measure(lambda: RationalAgent.decide_many(texts, max_workers=1), repeat=1)
+        pool = measure(lambda: RationalAgent.decide_many(texts, max_workers=4), repeat=1)
+        print("%10d %10.0f %10.0f %10.0f" % (n, n / single, n / batch, n / pool))
+
+def bench_safe():
+    from agents import SafeAgent
+    print("SafeAgent.decide latency (ms)")
+    print("%10s %10s %10s" % ("tasks", "in-process", "pulp"))
+    for n_tasks in (10, 100, 1000):
+        # A task that can't go wrong keeps the problem feasible.
+        agent = SafeAgent("s", parse_lottery(random_lottery(n_tasks)[:-1] + ", Safe=[s=(1,1)])"), cache=False)
+        expected_reward = agent.lottery.calculate_pondered_values()
+        worst_case = agent.lottery.calculate_worst_cases()
+        fast = measure(agent.decide)
+        try:
+            slow = "%10.2f" % (1000 * measure(lambda: agent.solve_with_pulp(expected_reward, worst_case)))
+        except Exception as e:
+            slow = "%10s" % type(e).__name__
+        print("%10d %10.2f %s" % (n_tasks, 1000 * fast, slow))
+
+def bench_cbc_io():
+    from dependencies import pulp
+    print("COIN_CMD solve time (ms), files on disk vs in memory")
+    print("%10s %10s %10s" % ("variables", "files", "in memory"))
+    for n_vars in (10, 100, 1000):
+        problem = random_problem(n_vars, n_vars // 2)
+        times = []
+        for in_memory in (False, True):
+            solver = pulp.PULP_CBC_CMD(inMemory=in_memory)
+            try:
+                times.append("%10.2f" % (1000 * measure(lambda: problem.solve(solver))))
+            except Exception as e:
+                times.append("%10s" % type(e).__name__)
+        print("%10d %s" % (n_vars, " ".join(times)))
+
+def bench_cbc_worker():
+    from dependencies import pulp
+    print("Solves per second of SafeAgent sized LPs")
+    print("%10s %10s %10s" % ("tasks", "cbc", "worker"))
+    for n_tasks in (5, 50):
+        problem = random_problem(n_tasks, 2, density=1)
+        rates = []
+        for solver in (pulp.PULP_CBC_CMD(), pulp.COIN_WORKER()):
+            try:
+                rates.append("%10.0f" % (20 / measure(lambda: [problem.solve(solver) for _ in range(20)])))
+            except Exception as e:
+                rates.append("%10s" % type(e).__name__)
+            finally:
+                if hasattr(solver, "close"): solver.close()
+        print("%10d %s" % (n_tasks, " ".join(rates)))
+
+def bench_write_mps():
+    import os, tempfile
+    print("LpProblem.writeMPS time (ms)")
+    print("%10s %10s %10s %10s" % ("variables", "nonzeros", "legacy", "writeMPS"))
+    path = os.path.join(tempfile.gettempdir(), "benchmark-pulp.mps")
+    try:
+        for n_vars in (1000, 10000, 100000):
+            problem = random_problem(n_vars, 100, density=10 / 100)
+            nonzeros = sum(len(c) for c in problem.constraints.values())
+            legacy = measure(lambda: legacy_write_mps(problem, path, rename=1), repeat=1)
+            new = measure(lambda: problem.writeMPS(path, rename=1), repeat=1)
+            print("%10d %10d %10.1f %10.1f" % (n_vars, nonzeros, 1000 * legacy, 1000 * new))
+    finally:
+        if os.path.exists(path): os.remove(path)
+
+def random_observations(n_tasks, n_outcomes=4, count=100000, seed=0):
+    rng = random.Random(seed)
+    return ["(%d, T%d.o%d)\n" % (rng.randint(-100, 100), rng.randrange(n_tasks), rng.randrange(n_outcomes))
+            for _ in range(count)]
+
+def legacy_sense(agent, line):
+    # The original RationalAgent.sense, kept as a baseline.
+    line = re.sub(r"[\s+]", "", line) #trim whitespaces
+    match = re.match(r"\((?P<value>-?\d+(?:.\d+)?),(?P<outcome>[a-zA-z]\w*(?:\.[a-zA-Z]\w*)*)\)", line)
+    value = eval(match.group("value"))
+    outcome_ids = match.group("outcome").split('.')
+    agent.update_observations(value, outcome_ids[0], outcome_ids[1:])
+
+def bench_sense():
+    from agents import RationalAgent
+    print("RationalAgent observations per second")
+    print("%10s %10s %10s %10s" % ("lines", "legacy", "sense", "sense_many"))
+    text = random_lottery(1000)
+    for count in (10000, 100000):
+        lines = random_observations(1000, count=count)
+        rates = []
+        for replay in (lambda agent: [legacy_sense(agent, line) for line in lines],
+                       lambda agent: [agent.sense(line) for line in lines],
+                       lambda agent: agent.sense_many(lines)):
+            agent = RationalAgent("r", parse_lottery(text))
+            rates.append(count / measure(lambda: (replay(agent), agent.decide()), repeat=1))
+        print("%10d %10.0f %10.0f %10.0f" % ((count,) + tuple(rates)))
+
+def bench_decide():
+    from agents import RationalAgent
+    print("RationalAgent decisions per second, one observation between each")
+    print("%10s %10s %10s" % ("tasks", "scan", "heap"))
+    for n_tasks in (100, 1000, 10000):
+        text = random_lottery(n_tasks)
+        lines = random_observations(n_tasks, count=1000)
+        rates = []
+        for use_heap in (False, True):
+            agent = RationalAgent("r", parse_lottery(text))
+            if use_heap:
+                decide = agent.decide
+            else:
+                decide = lambda: max(agent.lottery.calculate_pondered_values().items(),
+                                     key=lambda kv: kv[1])[0]
+            decide()
+            def replay():
+                for line in lines:
+                    agent.sense(line)
+                    decide()
+            rates.append(len(lines) / measure(replay, repeat=1))
+        print("%10d %10.0f %10.0f" % ((n_tasks,) + tuple(rates)))
+
+def deep_lottery(depth, n_outcomes=3, seed=0):
+    """
+    Generates the text of a one task lottery whose outcomes nest depth
+    levels deep.
+    """
+    rng = random.Random(seed)
+    text = str(rng.randint(-100, 100))
+    for level in range(depth):
+        siblings = ["o%d=(%d%%,%d)" % (i, rng.randint(1, 99), rng.randint(-100, 100))
+                    for i in range(1, n_outcomes)]
+        text = "[o0=(%d,%s),%s]" % (rng.randint(1, 9), text, ",".join(siblings))
+    return "(T=%s)" % text
+
+def legacy_evaluate(outcome):
+    # The original recursive evaluation, kept as a baseline.
+    if not outcome.is_composite():
+        if outcome.is_belief(): return outcome.value * outcome.probability, outcome.value
+        return outcome.value * outcome.occurrences, outcome.value
+    hard = [0, 0]
+    belief = [0, 0]
+    worst = None
+    for child in outcome.children.values():
+        pondered, child_worst = legacy_evaluate(child)
+        if child.is_belief(): belief[0] += pondered; belief[1] += child.probability
+        else: hard[0] += pondered; hard[1] += child.occurrences
+        if worst is None or child_worst < worst: worst = child_worst
+    sums = hard if hard[1] else belief
+    return sums[0] / sums[1], worst
+
+def bench_deep():
+    from compact_lottery import CompactLottery
+    print("Evaluation of deep lotteries (ms)")
+    print("%10s %10s %10s %10s %10s %10s" % ("depth", "build", "legacy", "evaluate", "update", "compact"))
+    for depth in (1000, 3000, 10000):
+        structure = LotteryParser(deep_lottery(depth)).parse()
+        build = measure(lambda: Lottery(structure))
+        lottery = Lottery(structure)
+        def legacy():
+            try:
+                for outcome in lottery.tasks["T"].outcomes.values():
+                    legacy_evaluate(outcome)
+            except RecursionError:
+                return True
+        legacy_time = float("nan") if legacy() else measure(legacy)
+        def evaluate():
+            lottery = Lottery(structure)
+            start = time.perf_counter()
+            lottery.calculate_pondered_values()
+            lottery.calculate_worst_cases()
+            return time.perf_counter() - start
+        evaluate_time = min(evaluate() for _ in range(3))
+        # Changes the deepest leaf, so that the whole path is evaluated again.
+        leaf = lottery.tasks["T"].outcomes["o0"]
+        while leaf.children:
+            leaf = leaf.children["o0"]
+        def update():
+            leaf.set_value(leaf.value + 1)
+            lottery.calculate_pondered_values()
+        update_time = measure(update)
+        compact = CompactLottery(structure)
+        compact_time = measure(compact.evaluate)
+        print("%10d %10.2f %10.2f %10.2f %10.2f %10.2f" % (depth, 1000 * build, 1000 * legacy_time,
+              1000 * evaluate_time, 1000 * update_time, 1000 * compact_time))
+
+def bench_share():
+    import tracemalloc
+    print("Lotteries whose tasks repeat a few outcome blocks")
+    print("%10s %10s %10s %10s %10s %10s" % ("tasks", "share", "build ms", "eval ms", "MB", "unique"))
+    rng = random.Random(0)
+    blocks = [random_outcomes(rng, 4, 3) for _ in range(10)]
+    for n_tasks in (1000, 10000):
+        structure = LotteryParser("(" + ",".join("T%d=[%s]" % (t, blocks[t % len(blocks)])
+                                                 for t in range(n_tasks)) + ")").parse()
+        for share in (False, True):
+            build = measure(lambda: Lottery(structure, share))
+            evaluate = measure(lambda lottery: lottery.calculate_pondered_values(), Lottery(structure, share), repeat=1)
+            tracemalloc.start()
+            lottery = Lottery(structure, share)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            unique = set()
+            stack = [outcome for task in lottery.tasks.values() for outcome in task.outcomes.values()]
+            while stack:
+                outcome = stack.pop()
+                if id(outcome) not in unique:
+                    unique.add(id(outcome))
+                    stack.extend(outcome.children.values())
+            print("%10d %10s %10.2f %10.2f %10.2f %10d" % (n_tasks, share, 1000 * build, 1000 * evaluate,
+                                                       size / 1e6, len(unique)))
+
+def bench_lazy():
+    from agents import RationalAgent
+    from lazy_lottery import LazyLottery
+    print("Time to first decision, and to the decision after one observation (ms)")
+    print("%10s %10s %10s %10s %10s %10s" % ("tasks", "size", "eager", "+sense", "lazy", "+sense"))
+    for n_tasks in (1000, 10000, 50000):
+        text = random_lottery(n_tasks)
+        line = random_observations(n_tasks, count=1)[0]
+        times = []
+        for build in (parse_lottery, LazyLottery):
+            start = time.perf_counter()
+            agent = RationalAgent("r", build(text))
+            agent.decide()
+            times.append(time.perf_counter() - start)
+            agent.sense(line)
+            agent.decide()
+            times.append(time.perf_counter() - start)
+        print("%10d %9.2fM %10.1f %10.1f %10.1f %10.1f" % ((n_tasks, len(text) / 1e6) +
+                                                       tuple(1000 * t for t in times)))
+
+def bench_binary():
+    import os
+    import tempfile
+    from compact_lottery import CompactLottery
+    from lottery_file import write_lottery, load_lottery
+    print("Loading a lottery from text and from a binary lottery file (s)")
+    print("%10s %10s %10s %10s %10s %10s" % ("nodes", "text MB", "parse", "+evaluate", "load", "+evaluate"))
+    path = os.path.join(tempfile.mkdtemp(), "bench.lotb")
+    for n_tasks in (10000, 100000, 300000):
+        text = random_lottery(n_tasks)
+        write_lottery(CompactLottery(LotteryParser(text).parse()), path)
+        start = time.perf_counter()
+        lottery = parse_lottery(text, CompactLottery)
+        parse = time.perf_counter() - start
+        lottery.calculate_pondered_values()
+        parse_evaluate = time.perf_counter() - start
+        nodes = len(lottery)
+        del lottery
+        start = time.perf_counter()
+        lottery = load_lottery(path)
+        load = time.perf_counter() - start
+        lottery.calculate_pondered_values()
+        load_evaluate = time.perf_counter() - start
+        lottery.close()
+        print("%10d %10.2f %10.3f %10.3f %10.3f %10.3f" % (nodes, len(text) / 1e6, parse, parse_evaluate,
+                                                        load, load_evaluate))
+    os.remove(path)
+
+def bench_checkpoint():
+    import os
+    import tempfile
+    from agents import RationalAgent
+    from checkpoint import ObservationJournal, save_checkpoint, load_checkpoint
+    print("Recovering an agent after 100000 observations (ms)")
+    print("%10s %10s %10s %10s %10s" % ("tasks", "rebuild", "save", "restore", "tail"))
+    directory = tempfile.mkdtemp()
+    for n_tasks in (1000, 10000):
+        text = random_lottery(n_tasks)
+        lines = random_observations(n_tasks, count=100000)
+        journal_path = os.path.join(directory, "journal")
+        checkpoint_path = os.path.join(directory, "checkpoint")
+        journal = ObservationJournal(journal_path)
+        agent = RationalAgent("r", parse_lottery(text))
+        for line in lines[:-1000]:
+            agent.sense(line)
+            journal.append(line)
+        save = measure(save_checkpoint, agent, checkpoint_path, journal, repeat=1)
+        for line in lines[-1000:]:
+            agent.sense(line)
+            journal.append(line)
+        journal.sync()
+
+        def rebuild():
+            agent = RationalAgent("r", parse_lottery(text))
+            agent.sense_many(journal.replay())
+            agent.decide()
+        def restore():
+            load_checkpoint(checkpoint_path, journal).decide()
+        print("%10d %10.1f %10.1f %10.1f %10d" % (n_tasks, 1000 * measure(rebuild, repeat=1), 1000 * save,
+                                               1000 * measure(restore), 1000))
+        journal.close()
+        os.remove(journal_path)
+        os.remove(checkpoint_path)
+
+def bench_what_if():
+    import copy
+    from agents import RationalAgent
+    print("What-if scenarios (one observation each) per second")
+    print("%10s %10s %10s" % ("tasks", "deepcopy", "what_if"))
+    for n_tasks in (100, 1000, 10000):
+        agent = RationalAgent("r", parse_lottery(random_lottery(n_tasks)))
+        agent.decide()
+        scenarios = random_observations(n_tasks, count=100, seed=1)
+        def deep_copies():
+            for line in scenarios[:10]:
+                scenario = copy.deepcopy(agent)
+                scenario.sense(line)
+                scenario.decide()
+        rates = (10 / measure(deep_copies, repeat=1), len(scenarios) / measure(agent.what_if, scenarios))
+        print("%10d %10.1f %10.0f" % ((n_tasks,) + rates))
+
+def bench_safe_cache():
+    from agents import RationalAgent, SafeAgent
+    print("SafeAgent decisions per second, the lottery changing between each")
+    print("%10s %10s %10s %10s %10s" % ("tasks", "solve", "rescan", "cached", "hit rate"))
+    for n_tasks in (10, 100, 1000, 10000):
+        text = random_lottery(n_tasks)[:-1] + ", Safe=[s=(1,1)])"
+        lines = random_observations(n_tasks, count=2000)
+        rates = []
+        for cache, rescan in ((False, False), (True, True), (True, False)):
+            lottery = parse_lottery(text)
+            agent = SafeAgent("s", lottery, cache)
+            # The observations reach the lottery through another agent.
+            observer = RationalAgent("r", lottery)
+            def replay():
+                for line in lines:
+                    observer.sense(line)
+                    # Forgetting the change log checks every task again.
+                    if rescan: agent.seen = None
+                    agent.decide()
+            rates.append(len(lines) / measure(replay, repeat=1))
+        print("%10d %10.0f %10.0f %10.0f %9.0f%%" % ((n_tasks,) + tuple(rates) + (100 * agent.hit_rate(),)))
+
+def bench_nash():
+    from agents import NashAgent
+    from games import lemke_howson
+    print("NashAgent rounds per second, a payoff changing every round")
+    print("%10s %10s %10s %10s %10s" % ("strategies", "first", "cold", "warm", "warm starts"))
+    for n_strategies in (10, 25, 50, 100, 150):
+        agent = NashAgent("n", parse_lottery(random_game(n_strategies)))
+        first = measure(agent.decide, repeat=1)
+        lines = random_game_observations(n_strategies, count=10 if n_strategies > 50 else 100)
+        def cold():
+            for line in lines:
+                agent.sense(line)
+                agent.update_game()
+                lemke_howson(agent.game)
+        def warm():
+            for line in lines:
+                agent.sense(line)
+                agent.decide()
+        rates = (len(lines) / measure(cold, repeat=1), len(lines) / measure(warm, repeat=1))
+        print("%10d %9.3fs %10.1f %10.1f %10d%%" % ((n_strategies, first) + rates + (100 * agent.warm_starts // len(lines),)))
+
+def ranked_bimatrix(n_strategies, noise, seed=0):
+    # A game where each strategy has a quality, which mostly decides its
+    # payoffs, so that the worse strategies tend to be dominated.
+    rng = random.Random(seed)
+    rows = [rng.randint(0, 1000) for _ in range(n_strategies)]
+    cols = [rng.randint(0, 1000) for _ in range(n_strategies)]
+    A = [[rows[i] + rng.randint(0, noise) for j in range(n_strategies)] for i in range(n_strategies)]
+    B = [[cols[j] + rng.randint(0, noise) for j in range(n_strategies)] for i in range(n_strategies)]
+    return A, B
+
+def bench_dominance():
+    from games import Bimatrix, eliminate_dominated, lemke_howson
+    print("Equilibrium of a game with ranked strategies, with and without removing the dominated ones")
+    print("%10s %6s %10s %10s %10s" % ("strategies", "noise", "remaining", "direct", "reduced"))
+    for n_strategies in (25, 50, 100):
+        for noise in (100, 1000, 10000):
+            game = Bimatrix(*ranked_bimatrix(n_strategies, noise))
+            reduction = eliminate_dominated(game)
+            def reduced():
+                reduction = eliminate_dominated(game)
+                lemke_howson(reduction.reduced())
+            print("%10d %6d %4dx%-5d %9.4fs %9.4fs" % (
+                n_strategies, noise, len(reduction.rows), len(reduction.cols),
+                measure(lemke_howson, game, repeat=1), measure(reduced, repeat=1)))
+
+def pulp_minimax(A):
+    # The minimax LP solved with PuLP and CBC, as a baseline.
+    from dependencies import pulp
+    problem = pulp.LpProblem("Minimax", pulp.LpMaximize)
+    xs = [pulp.LpVariable("x%d" % i, 0, 1) for i in range(len(A))]
+    v = pulp.LpVariable("v")
+    problem += v
+    for j in range(len(A[0])):
+        problem += pulp.LpAffineExpression([(xs[i], A[i][j]) for i in range(len(A))]) >= v
+    problem += pulp.lpSum(xs) == 1
+    problem.solve()
+    return [x.value() for x in xs]
+
+def bench_mixed():
+    from agents import MixedAgent
+    from games import MinimaxLP
+    print("MixedAgent rounds per second, one of its payoffs changing every round")
+    print("%10s %10s %10s %10s" % ("strategies", "pulp", "cold", "warm"))
+    for n_strategies in (10, 25, 50, 100):
+        agent = MixedAgent("m", parse_lottery(random_game(n_strategies)))
+        agent.decide()
+        lines = random_game_observations(n_strategies, count=200, players=("mine",))
+        def with_pulp():
+            for line in lines[:5]:
+                agent.sense(line)
+                agent.update_game()
+                pulp_minimax(agent.game.matrix(0))
+        def cold():
+            for line in lines[:5]:
+                agent.sense(line)
+                agent.update_game()
+                MinimaxLP(agent.game.matrix(0)).solve()
+        def warm():
+            for line in lines:
+                agent.sense(line)
+                agent.decide()
+        try:
+            slow = "%10.1f" % (5 / measure(with_pulp, repeat=1))
+        except Exception as e:
+            slow = "%10s" % type(e).__name__
+        rates = (5 / measure(cold, repeat=1), len(lines) / measure(warm, repeat=1))
+        print("%10d %s %10.2f %10.1f" % ((n_strategies, slow) + rates))
+
+def bench_conditional():
+    from agents import ConditionalAgent
+    print("ConditionalAgent decision time (ms) after a history of observations")
+    print("%10s %10s %10s %10s" % ("history", "recompute", "table", "profiles"))
+    rng = random.Random(0)
+    text = random_game(20)
+    # The others' actions are skewed, and many are new to the lottery.
+    lines = ["(%d, mine.S%d|R%d)" % (rng.randint(0, 1000), rng.randrange(20), int(rng.paretovariate(0.5)))
+             for _ in range(100000)]
+    for history in (1000, 10000, 100000):
+        agent = ConditionalAgent("c", parse_lottery(text), max_profiles=1000)
+        agent.sense_many(lines[:history])
+        def recompute():
+            # Expected values from the whole history, as a baseline.
+            sums = dict.fromkeys(agent.tasks, 0)
+            for line in lines[:history]:
+                profile = line.split("|")[1][:-1]
+                for task in agent.tasks:
+                    sums[task] += agent.payoff(task, profile)
+            return max(agent.tasks, key=sums.get)
+        times = (1000 * measure(recompute, repeat=1), 1000 * measure(agent.decide))
+        print("%10d %10.2f %10.4f %10d" % ((history,) + times + (len(agent.table),)))
+
+def bench_payoffs():
+    import os
+    import tempfile
+    from payoff_store import write_payoff_store, PayoffStore
+    print("Three player payoff stores: size, opening, and lines of payoffs read per second")
+    print("%10s %7s %10s %10s %10s %10s %10s" % ("strategies", "layout", "entries", "file MB",
+                                                "open ms", "first axis", "last axis"))
+    path = os.path.join(tempfile.mkdtemp(), "bench.pays")
+    rng = random.Random(0)
+    for n_strategies, density in ((20, 1.0), (50, 1.0), (50, 0.01), (200, 0.001)):
+        shape = [n_strategies] * 3
+        entries = {}
+        while len(entries) < density * n_strategies ** 3:
+            profile = tuple(rng.randrange(n_strategies) for _ in shape)
+            entries[profile] = [rng.uniform(-100, 100) for _ in shape]
+        strategies = [["S%d" % i for i in range(n_strategies)] for _ in shape]
+        write_payoff_store(path, ["P0", "P1", "P2"], strategies, entries)
+        start = time.perf_counter()
+        store = PayoffStore(path)
+        opening = time.perf_counter() - start
+        profiles = [[rng.randrange(n_strategies) for _ in shape] for _ in range(1000)]
+        rates = []
+        for axis in (0, 2):
+            rates.append(len(profiles) / measure(lambda: [store.line(1, axis, p) for p in profiles]))
+        print("%10d %7s %10d %10.2f %10.3f %10.0f %10.0f" % (
+            n_strategies, "sparse" if store.sparse else "dense", store.entries,
+            os.path.getsize(path) / 1e6, 1000 * opening, rates[0], rates[1]))
+        store.close()
+    os.remove(path)
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "batch": bench_batch,
+    "safe": bench_safe,
+    "cbc-io": bench_cbc_io,
+    "cbc-worker": bench_cbc_worker,
+    "write-mps": bench_write_mps,
+    "sense": bench_sense,
+    "decide": bench_decide,
+    "deep": bench_deep,
+    "share": bench_share,
+    "lazy": bench_lazy,
+    "binary": bench_binary,
+    "checkpoint": bench_checkpoint,
+    "what-if": bench_what_if,
+    "safe-cache": bench_safe_cache,
+    "nash": bench_nash,
+    "mixed": bench_mixed,
+    "conditional": bench_conditional,
+    "payoffs": bench_payoffs,
+    "dominance": bench_dominance,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,166 @@
+import os
+import time
+import pickle
+import struct
+from agents import *
+from compact_lottery import *
+from lottery_file import *
+
+# ===
+# Agent Checkpoints:
+# ===
+
+# A checkpoint is a header, the agent's lottery as a binary lottery file
+# (see lottery_file.py) and the pickled state of the agent, which holds the
+# evaluated pondered values and worst cases and the estimators, so that a
+# restored agent can decide without evaluating its lottery again.
+CHECKPOINT_MAGIC = b"AGCK"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<4sHxxQQ")
+
+def save_checkpoint(agent, path, journal=None):
+    """
+    Writes a checkpoint of the agent. Given the journal of the agent's
+    observations, the checkpoint remembers how much of it it includes, so
+    that only the rest has to be replayed.
+
+    The file is replaced atomically, so a crash leaves either the old or
+    the new checkpoint. The agent's estimator, if any, must be picklable
+    (e.g. a class, not a lambda).
+    """
+    lottery = agent.lottery
+    if not isinstance(lottery, CompactLottery):
+        lottery = CompactLottery.from_lottery(lottery)
+    lottery.update()
+    if journal is not None:
+        journal.sync()
+    state = {
+        "class": type(agent),
+        "agent": agent.snapshot_state(),
+        "pondered": lottery.pondered,
+        "worst": lottery.worst,
+        "estimators": lottery.estimators,
+        "journal": journal.tell() if journal is not None else 0,
+    }
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(bytes(CHECKPOINT_HEADER.size))
+        lottery_offset = f.tell()
+        dump_lottery(lottery, f)
+        f.write(bytes(-f.tell() % 8))
+        state_offset = f.tell()
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, lottery_offset, state_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_directory(path)
+
+def load_checkpoint(path, journal=None):
+    """
+    Restores an agent from a checkpoint, and replays the observations the
+    journal has after it. The agent's lottery is a MappedLottery, whatever
+    kind of lottery it was saved with.
+    """
+    with open(path, "rb") as f:
+        magic, version, lottery_offset, state_offset = CHECKPOINT_HEADER.unpack(f.read(CHECKPOINT_HEADER.size))
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError("%s is not a checkpoint" % path)
+        f.seek(state_offset)
+        state = pickle.load(f)
+
+    lottery = MappedLottery(path, lottery_offset)
+    lottery.pondered = state["pondered"]
+    lottery.worst = state["worst"]
+    lottery.estimators = state["estimators"]
+    lottery._evaluated = True
+
+    cls = state["class"]
+    agent = cls.__new__(cls)
+    agent.lottery = lottery
+    agent.restore_state(state["agent"])
+    if journal is not None:
+        agent.sense_many(journal.replay(state["journal"]))
+    return agent
+
+def fsync_directory(path):
+    # Makes a rename in the directory of path durable.
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class ObservationJournal:
+    """
+    An append-only file of the observations sensed by an agent, one per
+    line. Appending only writes to the file; it is fsynced in batches, once
+    batch_size lines are pending or interval seconds have passed since the
+    last sync, so a crash loses at most the last batch.
+    """
+
+    def __init__(self, path, batch_size=64, interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.file = open(path, "ab")
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self._drop_torn_line()
+
+    def _drop_torn_line(self):
+        # A crash can leave the last line cut short, which would otherwise
+        # be glued to the next one appended.
+        end = self.file.tell()
+        with open(self.path, "rb") as f:
+            position = end
+            while position > 0:
+                position = max(0, position - 4096)
+                f.seek(position)
+                block = f.read(end - position)
+                if block.endswith(b"\n"):
+                    return
+                newline = block.rfind(b"\n")
+                if newline >= 0:
+                    position += newline + 1
+                    break
+        if position < end:
+            self.file.truncate(position)
+            self.file.seek(position)
+
+    def append(self, line):
+        # Observations ignore whitespace, so a line never spans two lines.
+        self.file.write(line.translate(IGNORED_CHARS).encode() + b"\n")
+        self.pending += 1
+        if self.pending >= self.batch_size or time.monotonic() - self.last_sync >= self.interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        if self.pending:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def tell(self):
+        self.file.flush()
+        return self.file.tell()
+
+    def replay(self, offset=0):
+        """
+        Yields the observations from offset on. A last line cut short by a
+        crash is left out.
+        """
+        self.file.flush()
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield line.decode()
+
+    def close(self):
+        self.sync()
+        self.file.close()
@@ -0,0 +1,272 @@
+import os
+import sys
+import random
+import itertools
+import tempfile
+from benchmark import *
+
+# ===
+# Checks:
+# ===
+
+# Each check compares an optimized code path with what it must be
+# equivalent to on random inputs, and raises AssertionError on the first
+# difference. Run them with python checks.py [name ...].
+
+def mixed_problem(rng, n_vars, n_constraints):
+    """
+    Generates a random LpProblem with every kind of variable bound and
+    constraint sense.
+    """
+    from dependencies import pulp
+    problem = pulp.LpProblem("Mixed", rng.choice([pulp.LpMinimize, pulp.LpMaximize]))
+    bounds = [(0, 1), (0, None), (None, None), (None, 5), (-3, 7), (2, 2)]
+    xs = []
+    for i in range(n_vars):
+        low, up = rng.choice(bounds)
+        category = rng.choice([pulp.LpContinuous, pulp.LpInteger])
+        xs.append(pulp.LpVariable("x%d" % i, low, up, category))
+    for j in range(n_constraints):
+        coeffs = [(x, rng.randint(-10, 10)) for x in rng.sample(xs, rng.randint(1, n_vars))]
+        expression = pulp.LpAffineExpression(coeffs) + rng.randint(-5, 5)
+        sense = rng.choice([pulp.LpConstraintLE, pulp.LpConstraintEQ, pulp.LpConstraintGE])
+        problem += pulp.LpConstraint(expression, sense, "c%d" % j, rng.randint(-100, 100))
+    if rng.random() < 0.9:
+        problem += pulp.LpAffineExpression([(x, rng.randint(-10, 10)) for x in xs if rng.random() < 0.7])
+    return problem
+
+def check_write_mps():
+    from dependencies import pulp
+    directory = tempfile.mkdtemp()
+    legacy_path = os.path.join(directory, "legacy.mps")
+    path = os.path.join(directory, "new.mps")
+    rng = random.Random(0)
+    try:
+        for seed in range(30):
+            problem = mixed_problem(rng, rng.randint(1, 60), rng.randint(0, 40))
+            for rename in (0, 1):
+                for mip in (0, 1):
+                    for sense in (0, pulp.LpMinimize, pulp.LpMaximize):
+                        legacy_write_mps(problem, legacy_path, sense, rename, mip)
+                        problem.writeMPS(path, sense, rename, mip)
+                        with open(legacy_path) as legacy, open(path) as new:
+                            assert legacy.read() == new.read(), \
+                                "writeMPS differs on model %d (rename=%d, mip=%d, sense=%d)" % (seed, rename, mip, sense)
+        print("writeMPS matches the legacy writer on 30 models")
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+def random_bimatrix(rng, m, n):
+    # Small integers make degenerate games, with ties, and floats generic ones.
+    if rng.random() < 0.5: payoff = lambda: rng.randint(-5, 5)
+    else: payoff = lambda: rng.uniform(-10, 10)
+    return ([[payoff() for j in range(n)] for i in range(m)],
+            [[payoff() for j in range(n)] for i in range(m)])
+
+def is_equilibrium(A, B, x, y, tolerance=1e-7):
+    # Mixed strategies that are best responses to each other.
+    m, n = len(A), len(A[0])
+    if min(x) < -tolerance or min(y) < -tolerance or abs(sum(x) - 1) > tolerance or abs(sum(y) - 1) > tolerance:
+        return False
+    row_payoffs = [sum(A[i][j] * y[j] for j in range(n)) for i in range(m)]
+    col_payoffs = [sum(B[i][j] * x[i] for i in range(m)) for j in range(n)]
+    row_value = sum(p * u for p, u in zip(x, row_payoffs))
+    col_value = sum(p * v for p, v in zip(y, col_payoffs))
+    return max(row_payoffs) <= row_value + tolerance and max(col_payoffs) <= col_value + tolerance
+
+def check_nash():
+    from agents import NashAgent
+    from games import Bimatrix, lemke_howson, support, support_equilibrium
+    rng = random.Random(0)
+    for game in range(300):
+        m, n = rng.randint(1, 8), rng.randint(1, 8)
+        A, B = random_bimatrix(rng, m, n)
+        for label in range(m + n):
+            x, y = lemke_howson(Bimatrix(A, B), label)
+            assert is_equilibrium(A, B, x, y), "lemke_howson fails on game %d, label %d" % (game, label)
+            equilibrium = support_equilibrium(Bimatrix(A, B), support(x), support(y))
+            if equilibrium is not None:
+                assert is_equilibrium(A, B, *equilibrium), "support_equilibrium fails on game %d" % game
+    for seed in range(50):
+        n_strategies = 1 + seed % 6
+        agent = NashAgent("n", parse_lottery(random_game(n_strategies, seed)))
+        for line in random_game_observations(n_strategies, count=30, seed=seed):
+            agent.decide()
+            assert is_equilibrium(agent.game.matrix(0), agent.game.matrix(1), *agent.equilibrium), \
+                "NashAgent plays no equilibrium on game %d" % seed
+            agent.sense(line)
+    print("lemke_howson finds equilibria of 300 games from every label, NashAgent over 1500 changes")
+
+def is_minimax(A, x, y, value, tolerance=1e-6):
+    # x guarantees the row player value, and y holds it to value.
+    m, n = len(A), len(A[0])
+    guaranteed = min(sum(A[i][j] * x[i] for i in range(m)) for j in range(n))
+    conceded = max(sum(A[i][j] * y[j] for j in range(n)) for i in range(m))
+    return abs(guaranteed - value) <= tolerance and abs(conceded - value) <= tolerance
+
+def check_minimax():
+    from agents import MixedAgent
+    from games import MinimaxLP
+    rng = random.Random(0)
+    for game in range(200):
+        m, n = rng.randint(1, 8), rng.randint(1, 8)
+        A = random_bimatrix(rng, m, n)[0]
+        lp = MinimaxLP(A)
+        for change in range(20):
+            x, y, value = lp.solve()
+            cold = MinimaxLP(A).solve()[2]
+            assert is_minimax(A, x, y, value) and abs(value - cold) <= 1e-6, \
+                "warm MinimaxLP differs from a cold solve on game %d, change %d" % (game, change)
+            i, j = rng.randrange(m), rng.randrange(n)
+            A[i][j] = rng.choice([rng.randint(-8, 8), rng.uniform(-12, 12)])
+            lp.set_payoff(i, j, A[i][j])
+    for seed in range(50):
+        n_strategies = 1 + seed % 6
+        agent = MixedAgent("m", parse_lottery(random_game(n_strategies, seed)))
+        for line in random_game_observations(n_strategies, count=30, seed=seed, players=("mine",)):
+            agent.decide()
+            A = agent.game.matrix(0)
+            value = MinimaxLP(A).solve()[2]
+            guaranteed = min(sum(A[i][j] * agent.strategy[i] for i in range(len(A))) for j in range(len(A[0])))
+            assert abs(guaranteed - value) <= 1e-6, "MixedAgent isn't minimax on game %d" % seed
+            agent.sense(line)
+    print("MinimaxLP warm starts match cold solves over 4000 changes, MixedAgent over 1500")
+
+def check_dominance():
+    from games import Bimatrix, dominates, eliminate_dominated, lemke_howson
+    rng = random.Random(0)
+    for game in range(300):
+        # Ranked strategies, so that some of them are dominated.
+        m, n = rng.randint(1, 8), rng.randint(1, 8)
+        rows = [rng.randint(0, 5) for i in range(m)]
+        cols = [rng.randint(0, 5) for j in range(n)]
+        A = [[rows[i] + rng.randint(-2, 2) for j in range(n)] for i in range(m)]
+        B = [[cols[j] + rng.randint(-2, 2) for j in range(n)] for i in range(m)]
+        zero_sum = game % 3 == 0
+        if zero_sum: B = [[-a for a in row] for row in A]
+        weak = game % 2 == 1
+        bimatrix = Bimatrix(A, None if zero_sum else B)
+        reduction = eliminate_dominated(bimatrix, weak)
+        for change in range(10):
+            RA = reduction.reduce(0)
+            if change == 0:
+                for i in range(len(RA)):
+                    assert not any(k != i and dominates(RA[k], RA[i], weak) for k in range(len(RA))), \
+                        "a dominated strategy is left in game %d" % game
+            x, y = lemke_howson(reduction.reduced())
+            assert is_equilibrium(A, B, reduction.expand(x, 0), reduction.expand(y, 1)), \
+                "the reduced equilibrium of game %d isn't one of the game" % game
+            i, j = rng.randrange(m), rng.randrange(n)
+            A[i][j] = rng.randint(-3, 8)
+            B[i][j] = -A[i][j] if zero_sum else rng.randint(-3, 8)
+            justified = all(reduction.justified(step) for step in range(len(reduction.steps)))
+            assert reduction.holds(i, j) == justified, "holds is wrong in game %d, change %d" % (game, change)
+            if not justified:
+                reduction = eliminate_dominated(bimatrix, weak)
+    print("eliminate_dominated keeps equilibria of 300 games over 3000 changes")
+
+def check_checkpoint():
+    from agents import RationalAgent, SafeAgent
+    from checkpoint import save_checkpoint, load_checkpoint, ObservationJournal
+    from estimators import RunningMean
+    directory = tempfile.mkdtemp()
+    checkpoint_path = os.path.join(directory, "agent.ckpt")
+    for seed in range(60):
+        rng = random.Random(seed)
+        text = random_lottery(5, seed=seed)
+        # A safe task, so that a SafeAgent can decide without PuLP.
+        text = text[:-1] + ", Safe=[o0=(1,1)])"
+        agent = [RationalAgent("r", parse_lottery(text)),
+                 RationalAgent("r", parse_lottery(text), RunningMean),
+                 SafeAgent("s", parse_lottery(text))][seed % 3]
+        journal = ObservationJournal(os.path.join(directory, "journal%d" % seed), batch_size=rng.randint(1, 10))
+        saved = rng.randrange(60)
+        for step, line in enumerate(random_observations(5, count=60, seed=seed)):
+            agent.sense(line)
+            journal.append(line)
+            if step == saved:
+                save_checkpoint(agent, checkpoint_path, journal)
+        restored = load_checkpoint(checkpoint_path, journal)
+        assert restored.decide() == agent.decide(), "%s %d decides otherwise once restored" % (type(agent).__name__, seed)
+        journal.close()
+    print("checkpoints of RationalAgents and SafeAgents restore their decisions, with their journals")
+
+def check_conditional_memory():
+    import tracemalloc
+    from agents import ConditionalAgent
+    rng = random.Random(0)
+    agent = ConditionalAgent("c", parse_lottery(random_game(10)), max_profiles=50)
+    def sizes():
+        tasks = agent.lottery.tasks
+        return (len(agent.observed), sum(len(tasks[player].outcomes) for player in tasks),
+                tuple(agent.payoffs.shape), len(agent.payoffs.added), len(agent.table), len(agent.extra))
+    def sense(start, count):
+        # Profiles of the others the game doesn't have, each seen once
+        # apart from a few frequent ones.
+        for k in range(start, start + count):
+            agent.sense("(%d, mine.S%d|R%d)" % (rng.randint(0, 100), rng.randrange(10), k))
+            agent.sense("(%d, mine.S%d|R%d)" % (rng.randint(0, 100), rng.randrange(10), rng.randrange(20)))
+            agent.sense("(%d, peer.S%d|R%d)" % (rng.randint(0, 100), rng.randrange(10), k))
+        agent.decide()
+    sense(100, 1000)
+    tracemalloc.start()
+    before, first = tracemalloc.take_snapshot(), sizes()
+    sense(1100, 5000)
+    after, second = tracemalloc.take_snapshot(), sizes()
+    tracemalloc.stop()
+    assert first == second, "the agent grew from %s to %s" % (first, second)
+    growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    assert growth < 64 * 1024, "the agent grew by %d bytes" % growth
+    print("ConditionalAgent keeps 50 profiles over 6000 distinct ones, memory grew by %d bytes" % growth)
+
+def game_payoffs(agent):
+    # The nonzero payoffs of an agent's game, by the names of the profiles.
+    agent.update_game()
+    payoffs = {}
+    for player in range(len(agent.players)):
+        for names in itertools.product(*agent.strategies):
+            payoff = agent.payoffs.payoff(player, [agent.index[k][name] for k, name in enumerate(names)])
+            if payoff: payoffs[player, names] = payoff
+    return payoffs
+
+def check_store_agents():
+    from agents import ConditionalAgent, NashAgent, MixedAgent
+    from payoff_store import write_game
+    from estimators import RunningMean
+    directory = tempfile.mkdtemp()
+    for seed in range(30):
+        rng = random.Random(seed)
+        n = rng.randint(1, 5)
+        text = random_game(n, seed)
+        path = os.path.join(directory, "game%d.pays" % seed)
+        write_game(parse_lottery(text), path, rng.choice([None, True, False]))
+        for cls in (ConditionalAgent, NashAgent, MixedAgent):
+            estimator = rng.choice([None, RunningMean])
+            agent, store_agent = cls("a", parse_lottery(text), estimator), cls("s", path, estimator)
+            for line in random_game_observations(n + 2, 50, seed):
+                agent.sense(line)
+                store_agent.sense(line)
+                if cls is ConditionalAgent:
+                    assert agent.decide() == store_agent.decide(), "the agents decide otherwise on game %d" % seed
+                else:
+                    agent.decide()
+                    store_agent.decide()
+                assert game_payoffs(agent) == game_payoffs(store_agent), \
+                    "the %s games differ on game %d after %s" % (cls.__name__, seed, line)
+    print("agents reading payoff stores play the games of their lotteries, over 90 games")
+
+CHECKS = {
+    "write-mps": check_write_mps,
+    "nash": check_nash,
+    "minimax": check_minimax,
+    "dominance": check_dominance,
+    "checkpoint": check_checkpoint,
+    "conditional-memory": check_conditional_memory,
+    "store-agents": check_store_agents,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or CHECKS:
+        CHECKS[name]()
@@ -0,0 +1,421 @@
+import sys
+import copy
+from array import array
+from collections.abc import Mapping
+from lottery import *
+
+# ===
+# Compact (Array Backed) Lottery Implementation:
+# ===
+
+# Every task and outcome of a compact lottery is a node, stored as a row
+# of flat arrays. A node's parent always has a smaller index than the node
+# itself, so walking the arrays backwards visits children before parents.
+NO_NODE = -1
+
+COLUMNS = ("parent", "first_child", "last_child", "next_sibling", "name",
+           "occurrences", "probability", "value", "pondered", "worst")
+
+def copy_column(column):
+    if isinstance(column, memoryview):
+        return array(column.format, column.tobytes())
+    return column[:]
+
+class CompactLottery:
+    """
+    A lottery stored as contiguous columns instead of Task and Outcome
+    objects. It is meant for lotteries with a very large number of
+    outcomes and can be used anywhere a Lottery is expected.
+    """
+
+    def __init__(self, info):
+        self.names = []
+        self.name_ids = {}
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.last_child = array('i')
+        self.next_sibling = array('i')
+        self.name = array('i')
+        self.occurrences = array('d')
+        self.probability = array('d')
+        self.value = array('d')
+        self.pondered = array('d')
+        self.worst = array('d')
+        self.task_index = {}
+        self.tasks = CompactTasks(self)
+        self._evaluated = False
+        self._dirty = set()
+        self.estimators = {}
+        self.changes = ChangeLog()
+
+        for k, task in self.append_tasks(info):
+            self.task_index[k] = task
+
+    @classmethod
+    def from_lottery(cls, lottery):
+        compact = cls({})
+        for k, task in compact.append_tasks(lottery):
+            compact.task_index[k] = task
+        return compact
+
+    def append_tasks(self, lottery):
+        """
+        Appends the tasks of a lottery, given either as a Lottery or as
+        the structure it is built from, without registering them as tasks
+        of this lottery. Several lotteries can be stacked this way and
+        evaluated in a single pass. Returns the (name, node) of each task.
+        """
+        tasks = []
+        for k in lottery if isinstance(lottery, dict) else lottery.tasks:
+            task = self._append_node(k, 0, 0, 0, NO_NODE)
+            if isinstance(lottery, dict): self._append_structure(lottery[k], task)
+            else:
+                for outcome in lottery.tasks[k].outcomes.values():
+                    self._append_outcome(outcome, task)
+            tasks.append((k, task))
+        self._evaluated = False
+        return tasks
+
+    # Forking:
+
+    # Forks copy the columns, so an agent's outcomes never become shared.
+    owner = None
+
+    def fork(self):
+        lottery = CompactLottery.__new__(CompactLottery)
+        for column in COLUMNS:
+            setattr(lottery, column, copy_column(getattr(self, column)))
+        lottery.names = list(self.names)
+        lottery.name_ids = dict(self.name_ids)
+        lottery.task_index = dict(self.task_index)
+        lottery.tasks = CompactTasks(lottery)
+        lottery._evaluated = self._evaluated
+        lottery._dirty = set(self._dirty)
+        lottery.changes = ChangeLog()
+        lottery.estimators = {}
+        for node in self.estimators:
+            lottery.estimators[node] = copy.copy(self.estimators[node])
+        return lottery
+
+    def unshare_task(self, name):
+        return self.tasks[name]
+
+    def __len__(self):
+        return len(self.parent)
+
+    def intern(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return self.name_ids[name]
+
+    def _append_node(self, name, occurrences, probability, value, parent):
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.name.append(self.intern(name))
+        self.occurrences.append(occurrences)
+        self.probability.append(probability)
+        self.value.append(value)
+        self.pondered.append(0)
+        self.worst.append(0)
+        if parent != NO_NODE:
+            if self.last_child[parent] == NO_NODE: self.first_child[parent] = node
+            else: self.next_sibling[self.last_child[parent]] = node
+            self.last_child[parent] = node
+        return node
+
+    def _append_structure(self, info, parent):
+        stack = [(parent, info)]
+        while stack:
+            parent, children = stack.pop()
+            for name in children:
+                weight, content = children[name]
+                value = content if isinstance(content, (int, float)) else 0
+                if weight < 1: node = self._append_node(name, 0, weight, value, parent)
+                else: node = self._append_node(name, weight, 0, value, parent)
+                if isinstance(content, dict):
+                    stack.append((node, content))
+
+    def _append_outcome(self, outcome, parent):
+        # Copies an Outcome object (and its whole subtree) into the arrays.
+        start = len(self.parent)
+        stack = [(outcome, parent)]
+        while stack:
+            outcome, parent = stack.pop()
+            node = self._append_node(outcome.name, outcome.occurrences, outcome.probability, outcome.value, parent)
+            if outcome.estimator is not None: self.estimators[node] = copy.copy(outcome.estimator)
+            for child in reversed(list(outcome.children.values())):
+                stack.append((child, node))
+        return start
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def find_child(self, node, name):
+        name_id = self.name_ids.get(name)
+        for child in self.children(node):
+            if self.name[child] == name_id:
+                return child
+        return NO_NODE
+
+    # Evaluation:
+
+    def evaluate(self):
+        # Bottom-up reduction over the whole arrays: every node folds its
+        # pondered value and worst case into its parent's accumulators.
+        n = len(self.parent)
+        hard_sum = array('d', bytes(8 * n))
+        hard_occ = array('d', bytes(8 * n))
+        belief_sum = array('d', bytes(8 * n))
+        belief_prob = array('d', bytes(8 * n))
+        worst = array('d', [float("inf")]) * n
+        parent = self.parent
+        occurrences = self.occurrences
+        probability = self.probability
+        value = self.value
+        pondered = self.pondered
+        first_child = self.first_child
+        estimators = self.estimators
+
+        for i in range(n - 1, -1, -1):
+            if first_child[i] == NO_NODE and parent[i] != NO_NODE:
+                if occurrences[i] == 0: pondered[i] = value[i] * probability[i]
+                else: pondered[i] = value[i] * occurrences[i]
+                if estimators and i in estimators: worst[i] = estimators[i].worst
+                else: worst[i] = value[i]
+            elif hard_occ[i] != 0:
+                pondered[i] = hard_sum[i] / hard_occ[i]
+            else:
+                pondered[i] = belief_sum[i] / belief_prob[i]
+
+            p = parent[i]
+            if p != NO_NODE:
+                if occurrences[i] == 0:
+                    belief_sum[p] += pondered[i]
+                    belief_prob[p] += probability[i]
+                else:
+                    hard_sum[p] += pondered[i]
+                    hard_occ[p] += occurrences[i]
+                if worst[i] < worst[p]:
+                    worst[p] = worst[i]
+
+        self.worst = worst
+        self._evaluated = True
+
+    def _evaluate_node(self, node):
+        if self.first_child[node] == NO_NODE and self.parent[node] != NO_NODE:
+            if self.occurrences[node] == 0: self.pondered[node] = self.value[node] * self.probability[node]
+            else: self.pondered[node] = self.value[node] * self.occurrences[node]
+            if node in self.estimators: self.worst[node] = self.estimators[node].worst
+            else: self.worst[node] = self.value[node]
+            return
+        has_hard_evidence = False
+        pond_value = 0
+        occs = 0
+        worst = float("inf")
+        for child in self.children(node):
+            if self.occurrences[child] == 0:
+                if not has_hard_evidence:
+                    pond_value += self.pondered[child]
+                    occs += self.probability[child]
+            else:
+                if not has_hard_evidence:
+                    has_hard_evidence = True
+                    pond_value = self.pondered[child]
+                    occs = self.occurrences[child]
+                else:
+                    pond_value += self.pondered[child]
+                    occs += self.occurrences[child]
+            worst = min(worst, self.worst[child])
+        self.pondered[node] = pond_value / occs
+        self.worst[node] = worst
+
+    def refresh(self, node, start=None):
+        # Marks a changed node (and the nodes appended from `start` on) so
+        # that they and their ancestors get re-evaluated, once, the next
+        # time a value is asked for. Its task is logged, unless the node
+        # was already waiting to be re-evaluated.
+        if not self._evaluated or node not in self._dirty:
+            task = node
+            while self.parent[task] != NO_NODE:
+                task = self.parent[task]
+            self.changes.add(self.names[self.name[task]])
+        if not self._evaluated:
+            return
+        self._dirty.add(node)
+        if start is not None:
+            self._dirty.update(range(start, len(self.parent)))
+
+    def update(self):
+        if not self._evaluated:
+            self.evaluate()
+        elif self._dirty:
+            nodes = set()
+            for node in self._dirty:
+                while node != NO_NODE and node not in nodes:
+                    nodes.add(node)
+                    node = self.parent[node]
+            # Children always come after their parents.
+            for node in sorted(nodes, reverse=True):
+                self._evaluate_node(node)
+        self._dirty.clear()
+
+    def calculate_pondered_values(self):
+        self.update()
+        vals = {}
+        for k in self.task_index:
+            vals[k] = self.pondered[self.task_index[k]]
+        return vals
+
+    def calculate_worst_cases(self):
+        self.update()
+        vals = {}
+        for k in self.task_index:
+            vals[k] = self.worst[self.task_index[k]]
+        return vals
+
+# ===
+# Object Views over a Compact Lottery:
+# ===
+
+class CompactOutcome:
+    """
+    Presents a node of a compact lottery with the Outcome interface.
+    """
+
+    def __init__(self, lottery, node):
+        self.lottery = lottery
+        self.node = node
+
+    @property
+    def name(self):
+        return self.lottery.names[self.lottery.name[self.node]]
+
+    @property
+    def occurrences(self):
+        return self.lottery.occurrences[self.node]
+
+    @property
+    def probability(self):
+        return self.lottery.probability[self.node]
+
+    @property
+    def value(self):
+        return self.lottery.value[self.node]
+
+    @property
+    def children(self):
+        return CompactChildren(self.lottery, self.node)
+
+    def is_composite(self):
+        return self.lottery.first_child[self.node] != NO_NODE
+
+    def is_belief(self):
+        return self.occurrences == 0
+
+    def set_value(self, value):
+        self.lottery.value[self.node] = value
+        self.lottery.refresh(self.node)
+
+    def observe(self, value):
+        estimator = self.estimator
+        if estimator is None:
+            self.set_value(value)
+        else:
+            estimator.update(value)
+            self.lottery.occurrences[self.node] = estimator.weight
+            self.set_value(estimator.value)
+
+    @property
+    def estimator(self):
+        return self.lottery.estimators.get(self.node)
+
+    @estimator.setter
+    def estimator(self, estimator):
+        self.lottery.estimators[self.node] = estimator
+        self.lottery.refresh(self.node)
+
+    def add_child(self, outcome):
+        start = self.lottery._append_outcome(outcome, self.node)
+        self.lottery.refresh(self.node, start)
+
+    def invalidate(self):
+        self.lottery.refresh(self.node)
+
+    def unshare_child(self, name):
+        # Compact lotteries never share nodes.
+        return self.children[name]
+
+    def calculate_pondered_value(self):
+        self.lottery.update()
+        return self.lottery.pondered[self.node]
+
+    def calculate_worst_case(self):
+        self.lottery.update()
+        return self.lottery.worst[self.node]
+
+class CompactTask(CompactOutcome):
+    """
+    Presents a task of a compact lottery with the Task interface.
+    """
+
+    @property
+    def outcomes(self):
+        return CompactChildren(self.lottery, self.node)
+
+    def add_outcome(self, outcome):
+        self.add_child(outcome)
+
+    def unshare_outcome(self, name):
+        return self.outcomes[name]
+
+class CompactChildren(Mapping):
+    """
+    A read only name -> CompactOutcome mapping over the children of a node.
+    """
+
+    def __init__(self, lottery, node):
+        self.lottery = lottery
+        self.node = node
+
+    def __getitem__(self, name):
+        child = self.lottery.find_child(self.node, name)
+        if child == NO_NODE:
+            raise KeyError(name)
+        return CompactOutcome(self.lottery, child)
+
+    def __contains__(self, name):
+        return self.lottery.find_child(self.node, name) != NO_NODE
+
+    def __iter__(self):
+        for child in self.lottery.children(self.node):
+            yield self.lottery.names[self.lottery.name[child]]
+
+    def __len__(self):
+        return sum(1 for _ in self.lottery.children(self.node))
+
+class CompactTasks(Mapping):
+    """
+    A read only name -> CompactTask mapping over the tasks of a lottery.
+    """
+
+    def __init__(self, lottery):
+        self.lottery = lottery
+
+    def __getitem__(self, name):
+        return CompactTask(self.lottery, self.lottery.task_index[name])
+
+    def __contains__(self, name):
+        return name in self.lottery.task_index
+
+    def __iter__(self):
+        return iter(self.lottery.task_index)
+
+    def __len__(self):
+        return len(self.lottery.task_index)
@@ -1,6 +1,8 @@
 import re
+import sys
 from lottery import *
 from agents import *
+from lottery_cache import *
 
 # ===
 # Console for interaction:
@@ -12,8 +14,12 @@ class Console:
     according to the specification.
     """
     
-    def __init__(self):
+    def __init__(self, cache=None, journal=None):
         self.agent = None
+        self.cache = cache if cache is not None else LotteryCache()
+        # An optional ObservationJournal (see checkpoint.py) that records
+        # what the agent senses.
+        self.journal = journal
         
     def interaction_loop(self):
         while True:
@@ -22,15 +28,27 @@ class Console:
             if command == "exit":
                 return
             
-            match = re.match(r"(?P<command>^[A-Za-z](?:\w|-)*) (?P<lottery>\(.*\)) (?P<ncalls>\d+)", command)
+            match = re.match(r"(?P<command>^[A-Za-z](?:\w|-)*) (?P<lottery>\(.*\)|\S+\.pays) (?P<ncalls>\d+)", command)
             agent_type = match.group("command")
-            lottery = parse_lottery(match.group("lottery"))
+            lottery = match.group("lottery")
+            # The agents playing games can read the game from a payoff store
+            # (see payoff_store.py), given its path instead of a lottery.
+            if lottery.startswith("("):
+                lottery = self.cache.parse(lottery)
+            elif agent_type in ("decide-rational", "decide-risk"):
+                raise ValueError("%s needs a lottery." % agent_type)
             n_calls = eval(match.group("ncalls"))
             
             if agent_type == "decide-rational":
                 self.agent = RationalAgent(agent_type, lottery)
             elif agent_type == "decide-risk":
                 self.agent = SafeAgent(agent_type, lottery)
+            elif agent_type == "decide-conditional":
+                self.agent = ConditionalAgent(agent_type, lottery)
+            elif agent_type == "decide-nash":
+                self.agent = NashAgent(agent_type, lottery)
+            elif agent_type == "decide-mixed":
+                self.agent = MixedAgent(agent_type, lottery)
             else:
                 raise ValueError("Unkown Agent Type.")
             
@@ -42,8 +60,11 @@ class Console:
                     return
                 
                 self.agent.sense(result)
+                if self.journal is not None:
+                    self.journal.append(result)
                 
 
 if __name__ == "__main__":
-    console = Console()
+    # An optional path keeps parsed lotteries on disk between sessions.
+    console = Console(LotteryCache(sys.argv[1] if len(sys.argv) > 1 else None))
     console.interaction_loop()
\ No newline at end of file
@@ -33,6 +33,9 @@ from .constants import VERSION
 
 from .pulp import *
 from .amply import *
+import sys as _sys
+if _sys.version_info >= (3, 5):
+    from .parallel import *
 __doc__ = pulp.__doc__
 
 from . import tests
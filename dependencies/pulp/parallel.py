@@ -0,0 +1,184 @@
+# PuLP : Python LP Modeler
+
+"""
+Solving many independent problems at once.
+
+Command line solvers spend most of their time waiting on a solver
+process, so several problems can be solved concurrently from threads
+(solve_many) or from an asyncio event loop (solve_many_async).
+"""
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .constants import *
+from .solvers import COIN_CMD, COIN_WORKER, PulpSolverError
+from . import pulp
+
+__all__ = ['SolveResult', 'solve_many', 'solve_many_async']
+
+class SolveResult(object):
+    """
+    The outcome of solving one of the problems given to solve_many.
+
+    :ivar problem: the problem, whose variables hold the solution
+    :ivar status: the status returned by the solver
+    :ivar time: the wall clock seconds the solve took
+    :ivar error: the exception raised by the solver, if any
+    :ivar cancelled: True if the solve was cancelled or never started
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.status = LpStatusNotSolved
+        self.time = None
+        self.error = None
+        self.cancelled = False
+
+    def __repr__(self):
+        if self.cancelled:
+            state = "cancelled"
+        elif self.error is not None:
+            state = "error=%r" % self.error
+        else:
+            state = "%s in %.3fs" % (LpStatus[self.status], self.time)
+        return "<SolveResult %s: %s>" % (self.problem.name, state)
+
+def solve_many(problems, solver = None, max_workers = 4, progress = None,
+               cancel = None):
+    """
+    Solves independent problems with up to max_workers solves running at
+    the same time, and returns a SolveResult per problem, in order.
+
+    :param solver: the solver to use, defaults to the default solver
+    :param progress: optional progress(done, total, result), called (one
+        call at a time) as each problem finishes
+    :param cancel: optional threading.Event; once set, the problems that
+        have not started yet are reported as cancelled
+    """
+    results = [SolveResult(problem) for problem in problems]
+    solver = solver or pulp.LpSolverDefault
+    lock = threading.Lock()
+    done = [0]
+
+    def run(result):
+        if cancel is not None and cancel.is_set():
+            result.cancelled = True
+        else:
+            start = time.time()
+            try:
+                result.status = result.problem.solve(solver)
+            except Exception as e:
+                result.error = e
+            result.time = time.time() - start
+        with lock:
+            done[0] += 1
+            if progress is not None:
+                progress(done[0], len(results), result)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(executor.map(run, results))
+    return results
+
+async def solve_many_async(problems, solver = None, max_workers = 4,
+                           progress = None, cancel = None):
+    """
+    Like solve_many, but as a coroutine. Cbc is run with
+    asyncio.create_subprocess_exec, other solvers in the default executor.
+
+    Setting cancel (an asyncio.Event) or cancelling the coroutine kills
+    the running cbc processes; the former returns the results, with the
+    unfinished problems reported as cancelled.
+    """
+    results = [SolveResult(problem) for problem in problems]
+    solver = solver or pulp.LpSolverDefault
+    semaphore = asyncio.Semaphore(max_workers)
+    done = [0]
+
+    async def run(result):
+        async with semaphore:
+            if cancel is None or not cancel.is_set():
+                start = time.time()
+                try:
+                    result.status = await solve_async(result.problem, solver, cancel)
+                except asyncio.CancelledError:
+                    result.cancelled = True
+                    if cancel is None or not cancel.is_set():
+                        raise
+                except Exception as e:
+                    result.error = e
+                result.time = time.time() - start
+            else:
+                result.cancelled = True
+        done[0] += 1
+        if progress is not None:
+            progress(done[0], len(results), result)
+
+    await asyncio.gather(*[run(result) for result in results])
+    return results
+
+async def solve_async(lp, solver, cancel = None):
+    """Solves a single problem without blocking the event loop"""
+    if not isinstance(solver, COIN_CMD) or isinstance(solver, COIN_WORKER):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lp.solve, solver)
+    if not solver.executable(solver.path):
+        raise PulpSolverError("Pulp: cannot execute %s cwd: %s"%(solver.path,
+                               os.getcwd()))
+    wasNone, dummyVar = lp.fixObjective()
+    try:
+        with solver.tmpFiles(lp) as (paths, fds):
+            tmpMps, cbcMps = paths[1]
+            tmpSol, cbcSol = paths[2]
+            vs, variablesNames, constraintsNames, objectiveName = lp.writeMPS(
+                        tmpMps, rename = 1)
+            args = [cbcMps]
+            if lp.sense == LpMaximize:
+                args.append("max")
+            for option in solver.cbcOptions():
+                args.extend(option.split())
+            args.extend(["printingOptions", "all", "solution", cbcSol])
+            pipe = None if solver.msg else asyncio.subprocess.DEVNULL
+            cbc = await asyncio.create_subprocess_exec(solver.path, *args,
+                    stdout = pipe, stderr = pipe, pass_fds = fds)
+            try:
+                returncode = await wait_cancellable(cbc.wait(), cancel)
+            except BaseException:
+                if cbc.returncode is None:
+                    cbc.kill()
+                    await cbc.wait()
+                raise
+            if returncode != 0:
+                raise PulpSolverError("Pulp: Error while trying to execute " +
+                                      solver.path)
+            if not os.path.exists(tmpSol) or (fds and os.fstat(fds[2]).st_size == 0):
+                raise PulpSolverError("Pulp: Error while executing " + solver.path)
+            lp.status, values, reducedCosts, shadowPrices, slacks = solver.readsol_MPS(
+                        tmpSol, lp, lp.variables(),
+                        variablesNames, constraintsNames, objectiveName)
+    finally:
+        lp.restoreObjective(wasNone, dummyVar)
+    lp.assignVarsVals(values)
+    lp.assignVarsDj(reducedCosts)
+    lp.assignConsPi(shadowPrices)
+    lp.assignConsSlack(slacks, activity=True)
+    lp.solver = solver
+    return lp.status
+
+async def wait_cancellable(awaitable, cancel):
+    """Awaits awaitable, raising CancelledError if cancel gets set first"""
+    if cancel is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    cancelled = asyncio.ensure_future(cancel.wait())
+    try:
+        await asyncio.wait([task, cancelled], return_when = asyncio.FIRST_COMPLETED)
+    finally:
+        cancelled.cancel()
+    if not task.done():
+        task.cancel()
+        raise asyncio.CancelledError()
+    return task.result()
@@ -1178,17 +1178,12 @@ class LpProblem(object):
         lpcopy.sos2 = self.sos2.copy()
         return lpcopy
 
-    def normalisedNames(self):
-        constraintsNames = {}
-        i = 0
-        for k in self.constraints:
-            constraintsNames[k] = "C%07d" % i
-            i += 1
-        variablesNames = {}
-        i = 0
-        for k in self.variables():
-            variablesNames[k.name] = "X%07d" % i
-            i += 1
+    def normalisedNames(self, vs = None):
+        if vs is None: vs = self.variables()
+        constraintsNames = dict((k, "C%07d" % i)
+                                for i, k in enumerate(self.constraints))
+        variablesNames = dict((v.name, "X%07d" % i)
+                              for i, v in enumerate(vs))
         return constraintsNames, variablesNames, "OBJ"
 
     def isMIP(self):
@@ -1408,90 +1403,93 @@ class LpProblem(object):
 
     def writeMPS(self, filename, mpsSense = 0, rename = 0, mip = 1):
         wasNone, dummyVar = self.fixObjective()
-        f = open(filename, "w")
         if mpsSense == 0: mpsSense = self.sense
         cobj = self.objective
         if mpsSense != self.sense:
             n = cobj.name
             cobj = - cobj
             cobj.name = n
+        vs = self.variables()
         if rename:
-            constraintsNames, variablesNames, cobj.name = self.normalisedNames()
-        f.write("*SENSE:"+LpSenses[mpsSense]+"\n")
+            constraintsNames, variablesNames, cobj.name = self.normalisedNames(vs)
+            rowNames = [constraintsNames[k] for k in self.constraints]
+            colNames = [variablesNames[v.name] for v in vs]
+        else:
+            rowNames = list(self.constraints)
+            colNames = [v.name for v in vs]
         n = self.name
         if rename: n = "MODEL"
-        f.write("NAME          "+n+"\n")
-        vs = self.variables()
-        # constraints
-        f.write("ROWS\n")
         objName = cobj.name
         if not objName: objName = "OBJ"
-        f.write(" N  %s\n" % objName)
+        # The whole file is built as a list of lines and written at once.
+        lines = ["*SENSE:"+LpSenses[mpsSense]+"\n", "NAME          "+n+"\n"]
+        # constraints
+        lines.append("ROWS\n")
+        lines.append(" N  %s\n" % objName)
         mpsConstraintType = {LpConstraintLE:"L", LpConstraintEQ:"E", LpConstraintGE:"G"}
-        for k,c in self.constraints.items():
-            if rename: k = constraintsNames[k]
-            f.write(" "+mpsConstraintType[c.sense]+"  "+k+"\n")
+        constraints = list(self.constraints.values())
+        lines.extend([" "+mpsConstraintType[c.sense]+"  "+k+"\n"
+                      for k, c in zip(rowNames, constraints)])
         # matrix
-        f.write("COLUMNS\n")
-        # Creation of a dict of dict:
-        # coefs[nomVariable][nomContrainte] = coefficient
+        lines.append("COLUMNS\n")
+        # The coefficients are indexed by column in a single pass over the
+        # rows, so every column is then written in one go:
+        # coefs[variableName] = [(constraintName, coefficient), ...]
         coefs = {}
-        for k,c in self.constraints.items():
-            if rename: k = constraintsNames[k]
-            for v in c:
-                n = v.name
-                if rename: n = variablesNames[n]
-                if n in coefs:
-                    coefs[n][k] = c[v]
+        for k, c in zip(rowNames, constraints):
+            for v, a in c.items():
+                name = v.name
+                cv = coefs.get(name)
+                if cv is None:
+                    coefs[name] = [(k, a)]
                 else:
-                    coefs[n] = {k:c[v]}
-
-        for v in vs:
-            if mip and v.cat == LpInteger:
-                f.write("    MARK      'MARKER'                 'INTORG'\n")
-            n = v.name
-            if rename: n = variablesNames[n]
-            if n in coefs:
-                cv = coefs[n]
+                    cv.append((k, a))
+        objCoefs = dict((v.name, a) for v, a in cobj.items())
+        for v, n in zip(vs, colNames):
+            name = v.name
+            integer = mip and v.cat == LpInteger
+            if integer:
+                lines.append("    MARK      'MARKER'                 'INTORG'\n")
+            cv = coefs.get(name)
+            if cv is not None:
                 # Most of the work is done here
-                for k in cv: f.write("    %-8s  %-8s  % .12e\n" % (n,k,cv[k]))
-
+                prefix = "    %-8s  " % n
+                lines.extend([prefix + "%-8s  % .12e\n" % ka for ka in cv])
             # objective function
-            if v in cobj: f.write("    %-8s  %-8s  % .12e\n" % (n,objName,cobj[v]))
-            if mip and v.cat == LpInteger:
-                f.write("    MARK      'MARKER'                 'INTEND'\n")
+            if name in objCoefs:
+                lines.append("    %-8s  %-8s  % .12e\n" % (n,objName,objCoefs[name]))
+            if integer:
+                lines.append("    MARK      'MARKER'                 'INTEND'\n")
         # right hand side
-        f.write("RHS\n")
-        for k,c in self.constraints.items():
+        lines.append("RHS\n")
+        for k, c in zip(rowNames, constraints):
             c = -c.constant
-            if rename: k = constraintsNames[k]
             if c == 0: c = 0
-            f.write("    RHS       %-8s  % .12e\n" % (k,c))
+            lines.append("    RHS       %-8s  % .12e\n" % (k,c))
         # bounds
-        f.write("BOUNDS\n")
-        for v in vs:
-            n = v.name
-            if rename: n = variablesNames[n]
+        lines.append("BOUNDS\n")
+        for v, n in zip(vs, colNames):
             if v.lowBound != None and v.lowBound == v.upBound:
-                f.write(" FX BND       %-8s  % .12e\n" % (n, v.lowBound))
+                lines.append(" FX BND       %-8s  % .12e\n" % (n, v.lowBound))
             elif v.lowBound == 0 and v.upBound == 1 and mip and v.cat == LpInteger:
-                f.write(" BV BND       %-8s\n" % n)
+                lines.append(" BV BND       %-8s\n" % n)
             else:
                 if v.lowBound != None:
                     # In MPS files, variables with no bounds (i.e. >= 0)
                     # are assumed BV by COIN and CPLEX.
                     # So we explicitly write a 0 lower bound in this case.
                     if v.lowBound != 0 or (mip and v.cat == LpInteger and v.upBound == None):
-                        f.write(" LO BND       %-8s  % .12e\n" % (n, v.lowBound))
+                        lines.append(" LO BND       %-8s  % .12e\n" % (n, v.lowBound))
                 else:
                     if v.upBound != None:
-                        f.write(" MI BND       %-8s\n" % n)
+                        lines.append(" MI BND       %-8s\n" % n)
                     else:
-                        f.write(" FR BND       %-8s\n" % n)
+                        lines.append(" FR BND       %-8s\n" % n)
                 if v.upBound != None:
-                    f.write(" UP BND       %-8s  % .12e\n" % (n, v.upBound))
-        f.write("ENDATA\n")
-        f.close()
+                    lines.append(" UP BND       %-8s  % .12e\n" % (n, v.upBound))
+        lines.append("ENDATA\n")
+        with open(filename, "w") as f:
+            f.write("".join(lines))
         self.restoreObjective(wasNone, dummyVar)
         # returns the variables, in writing order
         if rename == 0:
@@ -40,6 +40,13 @@ except ImportError:
     import ConfigParser as configparser
 from . import sparse
 import collections
+import contextlib
+import io
+import select
+import shutil
+import tempfile
+import threading
+import time
 import warnings
 from tempfile import mktemp
 from .constants import *
@@ -1335,7 +1342,8 @@ class COIN_CMD(LpSolver_CMD):
     def __init__(self, path = None, keepFiles = 0, mip = 1,
             msg = 0, cuts = None, presolve = None, dual = None,
             strong = None, options = [],
-            fracGap = None, maxSeconds = None, threads = None):
+            fracGap = None, maxSeconds = None, threads = None,
+            inMemory = False):
         LpSolver_CMD.__init__(self, path, keepFiles, mip, msg, options)
         self.cuts = cuts
         self.presolve = presolve
@@ -1344,6 +1352,7 @@ class COIN_CMD(LpSolver_CMD):
         self.fracGap = fracGap
         self.maxSeconds = maxSeconds
         self.threads = threads
+        self.inMemory = inMemory
         #TODO hope this gets fixed in cbc as it does not like the c:\ in windows paths
         if os.name == 'nt':
             self.tmpDir = ''
@@ -1355,6 +1364,7 @@ class COIN_CMD(LpSolver_CMD):
         aCopy.presolve = self.presolve
         aCopy.dual = self.dual
         aCopy.strong = self.strong
+        aCopy.inMemory = self.inMemory
         return aCopy
 
     def actualSolve(self, lp, **kwargs):
@@ -1365,90 +1375,127 @@ class COIN_CMD(LpSolver_CMD):
         """True if the solver is available"""
         return self.executable(self.path)
 
-    def solve_CBC(self, lp, use_mps=True):
-        """Solve a MIP problem using CBC"""
-        if not self.executable(self.path):
-            raise PulpSolverError("Pulp: cannot execute %s cwd: %s"%(self.path,
-                                   os.getcwd()))
-        if not self.keepFiles:
-            uuid = uuid4().hex
-            tmpLp = os.path.join(self.tmpDir, "%s-pulp.lp" % uuid)
-            tmpMps = os.path.join(self.tmpDir, "%s-pulp.mps" % uuid)
-            tmpSol = os.path.join(self.tmpDir, "%s-pulp.sol" % uuid)
-        else:
-            tmpLp = lp.name+"-pulp.lp"
-            tmpMps = lp.name+"-pulp.mps"
-            tmpSol = lp.name+"-pulp.sol"
-        if use_mps:
-            vs, variablesNames, constraintsNames, objectiveName = lp.writeMPS(
-                        tmpMps, rename = 1)
-            cmds = ' '+tmpMps+" "
-            if lp.sense == LpMaximize:
-                cmds += 'max '
-        else:
-            lp.writeLP(tmpLp)
-            cmds = ' '+tmpLp+" "
+    def cbcOptions(self):
+        """The cbc commands for the options of this solver, up to the solve"""
+        cmds = []
         if self.threads:
-            cmds += "threads %s "%self.threads
+            cmds.append("threads %s"%self.threads)
         if self.fracGap is not None:
-            cmds += "ratio %s "%self.fracGap
+            cmds.append("ratio %s"%self.fracGap)
         if self.maxSeconds is not None:
-            cmds += "sec %s "%self.maxSeconds
+            cmds.append("sec %s"%self.maxSeconds)
         if self.presolve:
-            cmds += "presolve on "
+            cmds.append("presolve on")
         if self.strong:
-            cmds += "strong %d " % self.strong
+            cmds.append("strong %d" % self.strong)
         if self.cuts:
-            cmds += "gomory on "
+            cmds.append("gomory on")
             #cbc.write("oddhole on "
-            cmds += "knapsack on "
-            cmds += "probing on "
-        for option in self.options:
-            cmds += option+" "
+            cmds.append("knapsack on")
+            cmds.append("probing on")
+        cmds.extend(self.options)
         if self.mip:
-            cmds += "branch "
+            cmds.append("branch")
         else:
-            cmds += "initialSolve "
-        cmds += "printingOptions all "
-        cmds += "solution "+tmpSol+" "
-        if self.msg:
-            pipe = None
-        else:
-            pipe = open(os.devnull, 'w')
-        log.debug(self.path + cmds)
-        args = []
-        args.append(self.path)
-        args.extend(cmds[1:].split())
-        cbc = subprocess.Popen(args, stdout = pipe, stderr = pipe)
-        if cbc.wait() != 0:
-            raise PulpSolverError("Pulp: Error while trying to execute " +  \
-                                    self.path)
-        if not os.path.exists(tmpSol):
-            raise PulpSolverError("Pulp: Error while executing "+self.path)
-        if use_mps:
-            lp.status, values, reducedCosts, shadowPrices, slacks = self.readsol_MPS(
-                        tmpSol, lp, lp.variables(),
-                        variablesNames, constraintsNames, objectiveName)
-        else:
-            lp.status, values, reducedCosts, shadowPrices, slacks = self.readsol_LP(
-                    tmpSol, lp, lp.variables())
+            cmds.append("initialSolve")
+        return cmds
+
+    @contextlib.contextmanager
+    def tmpFiles(self, lp):
+        """
+        Yields the lp, mps and solution files used to talk to cbc, as a
+        list of (path for pulp, path for cbc) pairs, and the file
+        descriptors cbc has to inherit. Temporary files are removed when
+        the block exits, even after an error.
+
+        With inMemory the files are anonymous memory files (memfd) on
+        Linux, or files in a tmpfs such as /dev/shm, so no model or
+        solution ever goes through the disk.
+        """
+        if self.keepFiles:
+            yield [(lp.name + ext,) * 2 for ext in ("-pulp.lp", "-pulp.mps", "-pulp.sol")], ()
+            return
+        fds = []
+        paths = []
+        try:
+            if self.inMemory and hasattr(os, "memfd_create"):
+                for ext in ("-pulp.lp", "-pulp.mps", "-pulp.sol"):
+                    fd = os.memfd_create(ext[1:])
+                    fds.append(fd)
+                    # cbc inherits the descriptors with the same numbers.
+                    paths.append(("/proc/self/fd/%d" % fd, "/dev/fd/%d" % fd))
+                yield paths, tuple(fds)
+            else:
+                tmpDir = self.tmpDir
+                if self.inMemory and os.path.isdir("/dev/shm"):
+                    tmpDir = "/dev/shm"
+                uuid = uuid4().hex
+                for ext in ("-pulp.lp", "-pulp.mps", "-pulp.sol"):
+                    path = os.path.join(tmpDir, uuid + ext)
+                    paths.append((path, path))
+                yield paths, ()
+        finally:
+            for fd in fds:
+                os.close(fd)
+            if not fds:
+                for path, _ in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def solve_CBC(self, lp, use_mps=True):
+        """Solve a MIP problem using CBC"""
+        if not self.executable(self.path):
+            raise PulpSolverError("Pulp: cannot execute %s cwd: %s"%(self.path,
+                                   os.getcwd()))
+        with self.tmpFiles(lp) as (paths, fds):
+            (tmpLp, cbcLp), (tmpMps, cbcMps), (tmpSol, cbcSol) = paths
+            if use_mps:
+                vs, variablesNames, constraintsNames, objectiveName = lp.writeMPS(
+                            tmpMps, rename = 1)
+                cmds = ' '+cbcMps+" "
+                if lp.sense == LpMaximize:
+                    cmds += 'max '
+            else:
+                lp.writeLP(tmpLp)
+                cmds = ' '+cbcLp+" "
+            for option in self.cbcOptions():
+                cmds += option+" "
+            cmds += "printingOptions all "
+            cmds += "solution "+cbcSol+" "
+            if self.msg:
+                pipe = None
+            else:
+                pipe = open(os.devnull, 'w')
+            log.debug(self.path + cmds)
+            args = []
+            args.append(self.path)
+            args.extend(cmds[1:].split())
+            if fds:
+                cbc = subprocess.Popen(args, stdout = pipe, stderr = pipe, pass_fds = fds)
+            else:
+                cbc = subprocess.Popen(args, stdout = pipe, stderr = pipe)
+            try:
+                if cbc.wait() != 0:
+                    raise PulpSolverError("Pulp: Error while trying to execute " +  \
+                                            self.path)
+            finally:
+                if pipe is not None:
+                    pipe.close()
+            if not os.path.exists(tmpSol) or (fds and os.fstat(fds[2]).st_size == 0):
+                raise PulpSolverError("Pulp: Error while executing "+self.path)
+            if use_mps:
+                lp.status, values, reducedCosts, shadowPrices, slacks = self.readsol_MPS(
+                            tmpSol, lp, lp.variables(),
+                            variablesNames, constraintsNames, objectiveName)
+            else:
+                lp.status, values, reducedCosts, shadowPrices, slacks = self.readsol_LP(
+                        tmpSol, lp, lp.variables())
         lp.assignVarsVals(values)
         lp.assignVarsDj(reducedCosts)
         lp.assignConsPi(shadowPrices)
         lp.assignConsSlack(slacks, activity=True)
-        if not self.keepFiles:
-            try:
-                os.remove(tmpMps)
-            except:
-                pass
-            try:
-                os.remove(tmpLp)
-            except:
-                pass
-            try:
-                os.remove(tmpSol)
-            except:
-                pass
         return lp.status
 
     def readsol_MPS(self, filename, lp, vs, variablesNames, constraintsNames,
@@ -1456,6 +1503,15 @@ class COIN_CMD(LpSolver_CMD):
         """
         Read a CBC solution file generated from an mps file (different names)
         """
+        with open(filename) as f:
+            return self.parsesol_MPS(f, lp, vs, variablesNames,
+                                     constraintsNames, objectiveName)
+
+    def parsesol_MPS(self, f, lp, vs, variablesNames, constraintsNames,
+                objectiveName):
+        """
+        Parse the lines of a CBC solution generated from an mps file
+        """
         values = {}
 
         reverseVn = {}
@@ -1477,25 +1533,24 @@ class COIN_CMD(LpSolver_CMD):
                     'Integer': LpStatusInfeasible,
                     'Unbounded': LpStatusUnbounded,
                     'Stopped': LpStatusNotSolved}
-        with open(filename) as f:
-            statusstr = f.readline().split()[0]
-            status = cbcStatus.get(statusstr, LpStatusUndefined)
-            for l in f:
-                if len(l)<=2:
-                    break
-                l = l.split()
-                #incase the solution is infeasible
-                if l[0] == '**':
-                    l = l[1:]
-                vn = l[1]
-                val = l[2]
-                dj = l[3]
-                if vn in reverseVn:
-                    values[reverseVn[vn]] = float(val)
-                    reducedCosts[reverseVn[vn]] = float(dj)
-                if vn in reverseCn:
-                    slacks[reverseCn[vn]] = float(val)
-                    shadowPrices[reverseCn[vn]] = float(dj)
+        statusstr = f.readline().split()[0]
+        status = cbcStatus.get(statusstr, LpStatusUndefined)
+        for l in f:
+            if len(l)<=2:
+                break
+            l = l.split()
+            #incase the solution is infeasible
+            if l[0] == '**':
+                l = l[1:]
+            vn = l[1]
+            val = l[2]
+            dj = l[3]
+            if vn in reverseVn:
+                values[reverseVn[vn]] = float(val)
+                reducedCosts[reverseVn[vn]] = float(dj)
+            if vn in reverseCn:
+                slacks[reverseCn[vn]] = float(val)
+                shadowPrices[reverseCn[vn]] = float(dj)
         return status, values, reducedCosts, shadowPrices, slacks
 
     def readsol_LP(self, filename, lp, vs):
@@ -1562,6 +1617,234 @@ class PULP_CBC_CMD(COIN_CMD):
             #check that the file is executable
             COIN_CMD.__init__(self, path=self.pulp_cbc_path, *args, **kwargs)
 
+class CbcWorker(object):
+    """
+    A cbc process kept running in interactive mode. Models are handed to
+    it through an mps file and the solution comes back through a fifo, so
+    reading the solution up to its end also tells when cbc is done.
+
+    The output of cbc is read as well, so that a run whose commands cbc
+    has all gone through without writing a solution (an invalid model, or
+    an error leaving it at its prompt) fails at once instead of waiting
+    for the timeout.
+    """
+
+    def __init__(self, path, tmpDir, msg = 0):
+        self.dir = tempfile.mkdtemp(prefix = "pulp-cbc-", dir = tmpDir or None)
+        self.mpsPath = os.path.join(self.dir, "model.mps")
+        self.solPath = os.path.join(self.dir, "model.sol")
+        os.mkfifo(self.solPath)
+        self.msg = msg
+        try:
+            self.process = subprocess.Popen([path], stdin = subprocess.PIPE,
+                    stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                    universal_newlines = True)
+        except:
+            shutil.rmtree(self.dir, ignore_errors = True)
+            raise
+        self.output = self.process.stdout.fileno()
+        os.set_blocking(self.output, False)
+        self.solves = 0
+        self.runs = 0
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def read_output(self):
+        """Reads what cbc has printed so far, without waiting"""
+        chunks = []
+        while True:
+            try:
+                chunk = os.read(self.output, 1 << 16)
+            except (IOError, OSError):
+                # Nothing more for now (EAGAIN).
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        text = b"".join(chunks).decode(errors = "replace")
+        if text and self.msg:
+            sys.stdout.write(text)
+        return text
+
+    def run(self, commands, timeout = 600):
+        """
+        Sends the commands to cbc and returns the text of the solution it
+        writes. Raises PulpSolverError if cbc dies, goes through every
+        command without writing the solution, or takes longer than timeout
+        seconds (None waits for as long as it takes).
+        """
+        # cbc answers an unknown command with "No match for <command>",
+        # which tells when it has gone through all the others.
+        self.runs += 1
+        marker = "pulpend%d" % self.runs
+        done = "No match for " + marker
+        # The fifo is reopened for every solve: once a writer has closed
+        # it, it would otherwise keep reporting the end of the file.
+        fd = os.open(self.solPath, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            self.process.stdin.write("\n".join(commands + [marker]) + "\n")
+            self.process.stdin.flush()
+            deadline = None if timeout is None else time.time() + timeout
+            chunks = []
+            output = ""
+            while True:
+                wait = 0.1
+                if deadline is not None:
+                    wait = min(wait, deadline - time.time())
+                    if wait <= 0:
+                        raise PulpSolverError("Pulp: cbc timed out")
+                ready = select.select([fd, self.output], [], [], wait)[0]
+                if self.output in ready:
+                    output += self.read_output()
+                if fd in ready:
+                    chunk = os.read(fd, 1 << 16)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                elif done in output:
+                    if not chunks:
+                        # Only what cbc printed for this run's commands.
+                        text = output[:output.index(done)]
+                        if "No match for pulpend" in text:
+                            text = text.rpartition("No match for pulpend")[2].partition("\n")[2]
+                        raise PulpSolverError("Pulp: cbc wrote no solution:\n" + text)
+                    # cbc has closed the fifo, only what it wrote is left.
+                    chunk = os.read(fd, 1 << 16)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                elif not self.alive():
+                    raise PulpSolverError("Pulp: cbc exited with code %s" %
+                                          self.process.returncode)
+        except (IOError, OSError) as e:
+            raise PulpSolverError("Pulp: lost cbc worker (%s)" % e)
+        finally:
+            os.close(fd)
+        self.solves += 1
+        return b"".join(chunks).decode()
+
+    def close(self, kill = False):
+        if self.alive():
+            try:
+                if kill:
+                    raise PulpSolverError("Pulp: killing cbc worker")
+                self.process.stdin.write("quit\n")
+                self.process.stdin.close()
+                self.process.wait(1)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.dir, ignore_errors = True)
+
+class COIN_WORKER(COIN_CMD):
+    """
+    Solves with a pool of long lived cbc processes in interactive mode
+    instead of starting a cbc per solve, which is what dominates the solve
+    time of small problems. Workers that crash or time out are killed and
+    replaced by fresh ones on the next solve, like idle workers that died
+    between solves. timeout is in seconds, None
+    to let a solve take as long as it needs.
+
+    Call close() (or use the solver as a context manager) to stop them.
+    """
+
+    def defaultPath(self):
+        if os.access(pulp_cbc_path, os.X_OK):
+            return pulp_cbc_path
+        return self.executableExtension(cbc_path)
+
+    def __init__(self, path = None, workers = 1, timeout = 600, *args, **kwargs):
+        COIN_CMD.__init__(self, path, *args, **kwargs)
+        self.workers = workers
+        self.timeout = timeout
+        self.idle = []
+        self.started = 0
+        self.condition = threading.Condition()
+
+    def copy(self):
+        """Make a copy of self, which gets its own workers"""
+        aCopy = COIN_CMD.copy(self)
+        aCopy.workers = self.workers
+        aCopy.timeout = self.timeout
+        aCopy.idle = []
+        aCopy.started = 0
+        aCopy.condition = threading.Condition()
+        return aCopy
+
+    def available(self):
+        """True if the solver is available"""
+        return hasattr(os, "mkfifo") and self.executable(self.path)
+
+    def acquire(self):
+        with self.condition:
+            while not self.idle and self.started >= self.workers:
+                self.condition.wait()
+            while self.idle:
+                worker = self.idle.pop()
+                if worker.alive():
+                    return worker
+                # An idle worker that died is replaced by a fresh one.
+                worker.close()
+                self.started -= 1
+            self.started += 1
+        try:
+            return CbcWorker(self.path, self.tmpDir, self.msg)
+        except:
+            self.release(None)
+            raise
+
+    def release(self, worker):
+        with self.condition:
+            if worker is None:
+                self.started -= 1
+            else:
+                self.idle.append(worker)
+            self.condition.notify()
+
+    def actualSolve(self, lp, **kwargs):
+        """Solve a well formulated lp problem"""
+        if not self.executable(self.path):
+            raise PulpSolverError("Pulp: cannot execute %s cwd: %s"%(self.path,
+                                   os.getcwd()))
+        worker = self.acquire()
+        try:
+            vs, variablesNames, constraintsNames, objectiveName = lp.writeMPS(
+                        worker.mpsPath, rename = 1)
+            commands = ["import " + worker.mpsPath]
+            commands.append("max" if lp.sense == LpMaximize else "min")
+            commands.extend(self.cbcOptions())
+            commands.append("printingOptions all")
+            commands.append("solution " + worker.solPath)
+            solution = worker.run(commands, self.timeout)
+        except:
+            worker.close(kill = True)
+            self.release(None)
+            raise
+        self.release(worker)
+        lp.status, values, reducedCosts, shadowPrices, slacks = self.parsesol_MPS(
+                    io.StringIO(solution), lp, lp.variables(),
+                    variablesNames, constraintsNames, objectiveName)
+        lp.assignVarsVals(values)
+        lp.assignVarsDj(reducedCosts)
+        lp.assignConsPi(shadowPrices)
+        lp.assignConsSlack(slacks, activity=True)
+        return lp.status
+
+    def close(self):
+        """Stop every idle worker"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.started -= len(idle)
+        for worker in idle:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def COINMP_DLL_load_dll(path):
     """
     function that loads the DLL useful for debugging installation problems
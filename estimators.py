@@ -0,0 +1,114 @@
+import math
+
+# ===
+# Online Estimators of Observed Values:
+# ===
+
+# An estimator folds the values observed for an outcome into an estimate in
+# O(1) time and memory, so that no history has to be kept. Its value feeds
+# the pondered value of the outcome, its weight the occurrences the value
+# is weighed with against the other outcomes, and its worst the worst case.
+# An estimator is seeded with the value and the occurrences the outcome had
+# before it was observed, which stand for that many earlier observations.
+
+class Estimator:
+    """
+    The base class of estimators. It counts the observations and tracks
+    the smallest one, which is the worst case.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.prior = 0
+        self.minimum = None
+        self.value = 0
+
+    def seed(self, value, occurrences):
+        # The value of the outcome, observed occurrences times before.
+        self.prior = occurrences
+        self.value = value
+        if occurrences: self.minimum = value
+
+    def update(self, x):
+        self.count += 1
+        if self.minimum is None or x < self.minimum:
+            self.minimum = x
+
+    @property
+    def weight(self):
+        # The number of observations the value stands for.
+        return self.prior + self.count
+
+    @property
+    def worst(self):
+        return self.minimum
+
+class LatestValue(Estimator):
+    """
+    Keeps the latest value, like an outcome without an estimator, which
+    keeps the occurrences it's seeded with (one if it isn't).
+    """
+
+    def __init__(self):
+        Estimator.__init__(self)
+        self.prior = 1
+
+    def update(self, x):
+        Estimator.update(self, x)
+        self.value = x
+
+    @property
+    def weight(self):
+        return self.prior
+
+    @property
+    def worst(self):
+        return self.value
+
+class RunningMean(Estimator):
+    """
+    The mean and the variance of every value observed (Welford's method),
+    the seeded ones included.
+    """
+
+    def __init__(self):
+        Estimator.__init__(self)
+        self.m2 = 0
+
+    def update(self, x):
+        Estimator.update(self, x)
+        delta = x - self.value
+        self.value += delta / self.weight
+        self.m2 += delta * (x - self.value)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.weight - 1) if self.weight > 1 else 0
+
+    @property
+    def deviation(self):
+        return math.sqrt(self.variance)
+
+class DecayedMean(Estimator):
+    """
+    An exponentially decayed mean, where each new value has weight alpha,
+    so that old observations are slowly forgotten.
+    """
+
+    def __init__(self, alpha=0.1):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        Estimator.__init__(self)
+        self.alpha = alpha
+
+    def update(self, x):
+        Estimator.update(self, x)
+        if self.count == 1 and not self.prior: self.value = x
+        else: self.value += self.alpha * (x - self.value)
+
+    @property
+    def weight(self):
+        # The sum of the weights of the values kept, at most 1 / alpha
+        # apart from what's left of the seeded occurrences.
+        kept = (1 - self.alpha) ** self.count
+        return self.prior * kept + (1 - kept) / self.alpha
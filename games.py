@@ -0,0 +1,533 @@
+import operator
+
+# ===
+# Equilibria of Bimatrix Games:
+# ===
+
+# A bimatrix game is a pair of payoff matrices A and B, with A[i][j] and
+# B[i][j] the payoffs of the row and the column player when they play their
+# strategies i and j. It's read a row or a column of payoffs at a time (see
+# Bimatrix), so that the payoffs can stay where they're kept, e.g. in a
+# payoff store. A mixed strategy is a list of probabilities, one per
+# strategy.
+
+TOLERANCE = 1e-9
+
+class Bimatrix:
+    """
+    The game (A, B) given as lists of rows. Without B the game is zero-sum,
+    B being -A.
+    """
+    
+    def __init__(self, A, B=None):
+        self.A = A
+        self.B = B
+        self.shape = (len(A), len(A[0]))
+    
+    def row(self, player, i):
+        # The payoffs of a player when the row player plays i.
+        if player == 0: return self.A[i]
+        if self.B is not None: return self.B[i]
+        return [-a for a in self.A[i]]
+    
+    def column(self, player, j):
+        # The payoffs of a player when the column player plays j.
+        if player == 1 and self.B is None: return [-row[j] for row in self.A]
+        return [row[j] for row in (self.A if player == 0 else self.B)]
+    
+    def submatrix(self, player, rows, cols):
+        """
+        The payoffs of a player (a list of rows) when the row player plays
+        one of rows and the column player one of cols.
+        """
+        matrix = []
+        for i in rows:
+            row = self.row(player, i)
+            matrix.append([row[j] for j in cols])
+        return matrix
+    
+    def matrix(self, player):
+        return self.submatrix(player, range(self.shape[0]), range(self.shape[1]))
+
+def lemke_howson(game, label=0):
+    """
+    Finds a Nash equilibrium (x, y) of a game (see Bimatrix) with the
+    Lemke-Howson algorithm, dropping the given label (a strategy of the row
+    player, or m + j for the column player's strategy j) first.
+    """
+    m, n = game.shape
+    rows = [game.row(0, i) for i in range(m)]
+    cols = [game.column(1, j) for j in range(n)]
+    # The payoffs are shifted to be positive, which changes no equilibrium.
+    low_a = min(min(row) for row in rows)
+    low_b = min(min(col) for col in cols)
+    # The labels are the columns of both tableaux: 0..m-1 for the row
+    # player's strategies and m..m+n-1 for the column player's. The row
+    # player's tableau has the constraints B^T x <= 1, one per label of the
+    # column player (its slack), and the other A y <= 1.
+    row_tableau = []
+    for j in range(n):
+        row = [b - low_b + 1 for b in cols[j]] + [0.0] * n + [1.0]
+        row[m + j] = 1.0
+        row_tableau.append(row)
+    col_tableau = []
+    for i in range(m):
+        row = [0.0] * m + [a - low_a + 1 for a in rows[i]] + [1.0]
+        row[i] = 1.0
+        col_tableau.append(row)
+    row_basis = list(range(m, m + n))
+    col_basis = list(range(m))
+    row_slacks = range(m, m + n)
+    col_slacks = range(m)
+
+    entering = label
+    in_rows = label < m
+    while True:
+        if in_rows: leaving = pivot(row_tableau, row_basis, entering, row_slacks)
+        else: leaving = pivot(col_tableau, col_basis, entering, col_slacks)
+        if leaving == label:
+            break
+        entering = leaving
+        in_rows = not in_rows
+
+    x = [0.0] * m
+    for r in range(n):
+        if row_basis[r] < m: x[row_basis[r]] = row_tableau[r][-1]
+    y = [0.0] * n
+    for r in range(m):
+        if col_basis[r] >= m: y[col_basis[r] - m] = col_tableau[r][-1]
+    return normalize(x), normalize(y)
+
+def pivot(tableau, basis, entering, slacks):
+    # Brings the entering label into the basis and returns the label that
+    # leaves it. Ties of the minimum ratio test are broken lexicographically
+    # on the slack columns, so that degenerate games don't cycle.
+    candidates = [r for r in range(len(tableau)) if tableau[r][entering] > TOLERANCE]
+    if not candidates:
+        raise ValueError("Unbounded pivot, the game is malformed")
+    ties = candidates
+    for c in [-1] + list(slacks):
+        if len(ties) == 1:
+            break
+        ratios = {r: tableau[r][c] / tableau[r][entering] for r in ties}
+        best = min(ratios.values())
+        ties = [r for r in ties if ratios[r] - best <= TOLERANCE * (1 + abs(best))]
+    best_row = ties[0]
+
+    prow = tableau[best_row]
+    p = prow[entering]
+    prow = tableau[best_row] = [v / p for v in prow]
+    for r in range(len(tableau)):
+        f = tableau[r][entering]
+        if r != best_row and f != 0:
+            tableau[r] = [a - f * b for a, b in zip(tableau[r], prow)]
+    leaving = basis[best_row]
+    basis[best_row] = entering
+    return leaving
+
+def normalize(weights):
+    total = sum(weights)
+    return [w / total for w in weights]
+
+def support(strategy):
+    return [i for i in range(len(strategy)) if strategy[i] > TOLERANCE]
+
+def support_equilibrium(game, rows, cols):
+    """
+    Returns the equilibrium (x, y) of a game where the row player plays the
+    strategies rows and the column player the strategies cols, or None if
+    there's none. In a nondegenerate game both supports have the same size
+    and there's at most one such equilibrium. Only the rows and the columns
+    of the supports are read.
+    """
+    if len(rows) != len(cols) or not rows:
+        return None
+    m, n = game.shape
+    A_cols = [game.column(0, j) for j in cols]
+    B_rows = [game.row(1, i) for i in rows]
+    # Each player mixes so that the other is indifferent between the
+    # strategies of its support.
+    y = indifferent_mix([[col[i] for col in A_cols] for i in rows])
+    x = indifferent_mix([[row[j] for row in B_rows] for j in cols])
+    if x is None or y is None:
+        return None
+    (x_support, v), (y_support, u) = x, y
+    full_x = [0.0] * m
+    for i, p in zip(rows, x_support): full_x[i] = p
+    full_y = [0.0] * n
+    for j, p in zip(cols, y_support): full_y[j] = p
+
+    # Neither player may have a better reply outside its support.
+    row_payoffs = [0.0] * m
+    for col, p in zip(A_cols, y_support):
+        for i in range(m): row_payoffs[i] += col[i] * p
+    if max(row_payoffs) > u + TOLERANCE * (1 + abs(u)):
+        return None
+    col_payoffs = [0.0] * n
+    for row, p in zip(B_rows, x_support):
+        for j in range(n): col_payoffs[j] += row[j] * p
+    if max(col_payoffs) > v + TOLERANCE * (1 + abs(v)):
+        return None
+    return full_x, full_y
+
+def indifferent_mix(M):
+    # Solves M z = u, sum(z) = 1 for a mix z >= 0 of the columns of the
+    # square matrix M. Returns (z, u), or None if there's no such mix.
+    k = len(M)
+    system = [M[i] + [-1.0, 0.0] for i in range(k)] + [[1.0] * k + [0.0, 1.0]]
+    solution = solve_linear(system)
+    if solution is None:
+        return None
+    z, u = solution[:k], solution[k]
+    if min(z) < -TOLERANCE:
+        return None
+    return [max(p, 0.0) for p in z], u
+
+def solve_linear(system):
+    # Gaussian elimination with partial pivoting of an augmented matrix
+    # (changed in place). Returns the solution, or None if it's singular.
+    n = len(system)
+    for c in range(n):
+        r = max(range(c, n), key=lambda r: abs(system[r][c]))
+        if abs(system[r][c]) <= TOLERANCE:
+            return None
+        system[c], system[r] = system[r], system[c]
+        prow = system[c]
+        for r in range(c + 1, n):
+            f = system[r][c] / prow[c]
+            if f != 0:
+                system[r] = [a - f * b for a, b in zip(system[r], prow)]
+    solution = [0.0] * n
+    for c in range(n - 1, -1, -1):
+        row = system[c]
+        solution[c] = (row[n] - sum(row[k] * solution[k] for k in range(c + 1, n))) / row[c]
+    return solution
+
+# ===
+# Zero-Sum Games:
+# ===
+
+class MinimaxLP:
+    """
+    The optimal (minimax) strategies of the zero-sum game where the row
+    player gets A[i][j] from the column player, found as the solution of
+    
+        max sum(w)  s.t.  A' w <= 1, w >= 0
+    
+    with A' the payoffs shifted to be positive. The column player plays w
+    normalized, and the row player the normalized dual solution.
+    
+    The final tableau is kept, and changing a payoff only updates its
+    column, so the next solve starts from the last optimal basis: the
+    primal simplex continues from it while it's feasible, the dual simplex
+    while it's still optimal, and otherwise a phase one from the basis
+    makes it feasible again. pivots counts the pivots done.
+    """
+    
+    def __init__(self, A):
+        self.A = [list(row) for row in A]
+        self.pivots = 0
+        self.tableau = None
+        self.phase_one = None
+    
+    def set_payoff(self, i, j, value):
+        self.A[i][j] = value
+        if self.tableau is None:
+            return
+        if value - self.shift <= 0:
+            self.tableau = None # A new lowest payoff changes the shift.
+            return
+        delta = (value - self.shift) - self.shifted[i][j]
+        self.shifted[i][j] += delta
+        # The column of slack i is B^-1 e_i, so the column of w_j changes by
+        # delta times it, like the reduced costs.
+        s = len(self.A[0]) + i
+        for row in self.tableau:
+            if row[s] != 0: row[j] += delta * row[s]
+        self.costs[j] += delta * self.costs[s]
+        r = self.basis.index(j) if j in self.basis else None
+        if r is not None:
+            # w_j is basic, so its column must be a unit column again.
+            if abs(self.tableau[r][j]) <= TOLERANCE: self.tableau = None
+            else: self.pivot(r, j)
+    
+    def build(self):
+        m, n = len(self.A), len(self.A[0])
+        self.shift = min(min(row) for row in self.A) - 1
+        self.shifted = [[a - self.shift for a in row] for row in self.A]
+        self.tableau = []
+        for i in range(m):
+            row = self.shifted[i] + [0.0] * m + [1.0]
+            row[n + i] = 1.0
+            self.tableau.append(row)
+        self.costs = [-1.0] * n + [0.0] * (m + 1)
+        self.basis = list(range(n, n + m))
+    
+    def solve(self):
+        """
+        Returns (x, y, value): the strategies of the row and the column
+        player and the value of the game for the row player.
+        """
+        if self.tableau is None:
+            self.build()
+        elif min(row[-1] for row in self.tableau) < -TOLERANCE:
+            if min(self.costs[:-1]) < -TOLERANCE or not self.dual_simplex():
+                if not self.restore_feasibility(): self.build()
+        if not self.primal_simplex():
+            # The LP is bounded, so only rounding errors piled up over warm
+            # starts can make a column look unbounded: solve from scratch.
+            self.build()
+            if not self.primal_simplex():
+                raise ValueError("Unbounded minimax LP, the payoffs are malformed")
+        
+        m, n = len(self.A), len(self.A[0])
+        w = [0.0] * n
+        for r in range(m):
+            if self.basis[r] < n: w[self.basis[r]] = max(self.tableau[r][-1], 0.0)
+        u = [max(c, 0.0) for c in self.costs[n:n + m]]
+        total = self.costs[-1]
+        return normalize(u), normalize(w), 1 / total + self.shift
+    
+    def primal_simplex(self, phase_one=False):
+        # Dantzig's rule, or Bland's after a degenerate pivot, which can't
+        # cycle. Returns False if the entering column has no positive entry
+        # (the objective is unbounded), leaving the tableau as it is.
+        degenerate = False
+        while True:
+            costs = self.phase_one if phase_one else self.costs
+            if degenerate:
+                entering = next((c for c in range(len(costs) - 1) if costs[c] < -TOLERANCE), None)
+            else:
+                entering = min(range(len(costs) - 1), key=costs.__getitem__)
+                if costs[entering] >= -TOLERANCE: entering = None
+            if entering is None:
+                return True
+            best_row, best = None, None
+            for r in range(len(self.tableau)):
+                a = self.tableau[r][entering]
+                if a > TOLERANCE:
+                    ratio = self.tableau[r][-1] / a
+                    if best is None or ratio < best - TOLERANCE or \
+                       (ratio <= best + TOLERANCE and self.basis[r] < self.basis[best_row]):
+                        best_row, best = r, ratio
+            if best_row is None:
+                return False
+            degenerate = best <= TOLERANCE
+            self.pivot(best_row, entering)
+    
+    def dual_simplex(self):
+        # Restores feasibility keeping the reduced costs nonnegative.
+        # Returns False if it can't.
+        while True:
+            costs = self.costs
+            r = min(range(len(self.tableau)), key=lambda r: self.tableau[r][-1])
+            row = self.tableau[r]
+            if row[-1] >= -TOLERANCE:
+                return True
+            entering, best = None, None
+            for c in range(len(row) - 1):
+                if row[c] < -TOLERANCE:
+                    ratio = costs[c] / -row[c]
+                    if best is None or ratio < best - TOLERANCE:
+                        entering, best = c, ratio
+            if entering is None:
+                return False
+            self.pivot(r, entering)
+    
+    def restore_feasibility(self):
+        # Phase one from the current basis: an artificial variable with -1
+        # in the infeasible rows enters at the most infeasible one, which
+        # makes every row feasible, and is then driven out by the primal
+        # simplex. Returns False if it can't.
+        artificial = len(self.costs) - 1
+        for row in self.tableau:
+            row.insert(artificial, -1.0 if row[-1] < -TOLERANCE else 0.0)
+        self.costs.insert(artificial, 0.0)
+        self.phase_one = [0.0] * artificial + [1.0, 0.0]
+        self.pivot(min(range(len(self.tableau)), key=lambda r: self.tableau[r][-1]), artificial)
+        # Phase one is bounded by 0, so an unbounded column is a rounding error.
+        feasible = self.primal_simplex(phase_one=True)
+        if feasible and artificial in self.basis:
+            r = self.basis.index(artificial)
+            row = self.tableau[r]
+            entering = next((c for c in range(artificial) if abs(row[c]) > TOLERANCE), None)
+            if row[-1] > TOLERANCE or entering is None: feasible = False
+            else: self.pivot(r, entering)
+        for row in self.tableau:
+            del row[artificial]
+        del self.costs[artificial]
+        self.phase_one = None
+        return feasible
+    
+    def pivot(self, r, entering):
+        self.pivots += 1
+        prow = self.tableau[r]
+        p = prow[entering]
+        prow = self.tableau[r] = [v / p for v in prow]
+        for k in range(len(self.tableau)):
+            f = self.tableau[k][entering]
+            if k != r and f != 0:
+                self.tableau[k] = [a - f * b for a, b in zip(self.tableau[k], prow)]
+        f = self.costs[entering]
+        if f != 0:
+            self.costs = [a - f * b for a, b in zip(self.costs, prow)]
+        if self.phase_one is not None and self.phase_one[entering] != 0:
+            f = self.phase_one[entering]
+            self.phase_one = [a - f * b for a, b in zip(self.phase_one, prow)]
+        self.basis[r] = entering
+
+# ===
+# Dominated Strategies:
+# ===
+
+def dominates(a, b, weak=False):
+    # True if the payoffs a dominate the payoffs b.
+    if weak:
+        return all(map(operator.ge, a, b)) and any(map(operator.gt, a, b))
+    return all(map(operator.gt, a, b))
+
+def eliminate_dominated(game, weak=False):
+    """
+    Removes the strictly (or weakly) dominated strategies of a game (see
+    Bimatrix) until none is left, and returns the Reduction.
+    
+    Every equilibrium of the reduced game is an equilibrium of the game.
+    Removing strictly dominated strategies keeps every equilibrium, and
+    the order they're removed in doesn't matter. Removing weakly dominated
+    ones can lose some equilibria.
+    """
+    reduction = Reduction(game, weak)
+    rows, cols = reduction.rows, reduction.cols
+    changed = True
+    while changed:
+        changed = False
+        payoffs = {i: pick(game.row(0, i), cols) for i in rows}
+        for i in list(rows):
+            for k in rows:
+                if k != i and dominates(payoffs[k], payoffs[i], weak):
+                    reduction.eliminate(0, i, k)
+                    changed = True
+                    break
+        payoffs = {j: pick(game.column(1, j), rows) for j in cols}
+        for j in list(cols):
+            for k in cols:
+                if k != j and dominates(payoffs[k], payoffs[j], weak):
+                    reduction.eliminate(1, j, k)
+                    changed = True
+                    break
+    reduction.index()
+    return reduction
+
+def pick(payoffs, strategies):
+    return [payoffs[k] for k in strategies]
+
+class Reduction:
+    """
+    The strategies of a game left after removing dominated ones: rows and
+    cols are the original indices of the strategies left to the row and
+    the column player, in order. steps records each removal, as (player,
+    strategy, dominating strategy), so that holds() can tell whether the
+    removals are still justified after a payoff changes.
+    """
+    
+    def __init__(self, game, weak):
+        self.game = game
+        self.weak = weak
+        self.rows = list(range(game.shape[0]))
+        self.cols = list(range(game.shape[1]))
+        self.steps = []
+        self.removed_at = [{}, {}]
+        self.involving = [{}, {}]
+    
+    def eliminate(self, player, strategy, dominator):
+        step = len(self.steps)
+        self.steps.append((player, strategy, dominator))
+        self.removed_at[player][strategy] = step
+        for k in (strategy, dominator):
+            self.involving[player].setdefault(k, []).append(step)
+        (self.rows if player == 0 else self.cols).remove(strategy)
+    
+    def index(self):
+        self.row_index = {i: r for r, i in enumerate(self.rows)}
+        self.col_index = {j: c for c, j in enumerate(self.cols)}
+    
+    def reduce(self, player):
+        """
+        The payoffs of a player (a list of rows) for the strategies left.
+        """
+        return self.game.submatrix(player, self.rows, self.cols)
+    
+    def reduced(self):
+        """
+        The game of the strategies left, as a Bimatrix.
+        """
+        return Bimatrix(self.reduce(0), self.reduce(1))
+    
+    def expand(self, strategy, player):
+        """
+        The mixed strategy of a player in the reduced game as a mixed
+        strategy of the game, playing no removed strategy.
+        """
+        left = self.rows if player == 0 else self.cols
+        full = [0.0] * self.game.shape[player]
+        for k, p in zip(left, strategy):
+            full[k] = p
+        return full
+    
+    def holds(self, i, j):
+        """
+        True if every removal still holds after the payoffs of the profile
+        (i, j) changed, in which case the reduced game is still valid.
+        Only the removals comparing strategy i or j are checked again.
+        """
+        for step in self.involving[0].get(i, ()):
+            if not self.justified(step): return False
+        for step in self.involving[1].get(j, ()):
+            if not self.justified(step): return False
+        return True
+    
+    def justified(self, step):
+        # Checks a removal against the strategies of the other player that
+        # were left when it was done.
+        player, strategy, dominator = self.steps[step]
+        removed_at = self.removed_at[1 - player]
+        left = [k for k in range(self.game.shape[1 - player]) if removed_at.get(k, step) >= step]
+        line = self.game.row if player == 0 else self.game.column
+        return dominates(pick(line(player, dominator), left), pick(line(player, strategy), left), self.weak)
+
+# ===
+# Game Lotteries:
+# ===
+
+# The payoffs of a game of n players are kept in a payoff store (see
+# payoff_store.py), written from a game lottery (see GameAgent).
+
+def outcome_payoff(outcome):
+    """
+    The payoff of an outcome of a game lottery: its value, whatever its
+    occurrences (which only weigh it against other outcomes), or the
+    pondered value of its own outcomes.
+    """
+    if outcome.is_composite(): return outcome.calculate_pondered_value()
+    return outcome.value
+
+def game_strategies(lottery):
+    """
+    Returns the players of a game lottery (see GameAgent), the names of
+    the strategies of each, in the order they appear, and for each player
+    a name -> index dict of its strategies.
+    """
+    tasks = lottery.tasks
+    players = list(tasks)
+    strategies = [[] for player in players]
+    index = [{} for player in players]
+    for player in players:
+        for profile in tasks[player].outcomes:
+            names = profile.split("|")
+            if len(names) != len(players):
+                raise ValueError("%s.%s is not a strategy profile" % (player, profile))
+            for k in range(len(names)):
+                if names[k] not in index[k]:
+                    index[k][names[k]] = len(strategies[k])
+                    strategies[k].append(names[k])
+    return players, strategies, index
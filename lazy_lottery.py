@@ -0,0 +1,218 @@
+import re
+from collections.abc import Mapping
+from lottery import *
+
+# ===
+# Lazy Lottery Implementation:
+# ===
+
+NAME = r"[a-zA-Z]\w*(?:\|[a-zA-Z]\w*)*"
+NUMBER = r"-?\d+(?:\.\d+)?%?"
+
+# The lottery language with whitespace removed, one outcome at a time. The
+# last group of each alternative tells what was matched: a leaf outcome (3),
+# the start (5) or the end (6) of an outcome list, the start (7) or the end
+# (8) of a task, or the parentheses around the lottery (9).
+SCAN_RE = re.compile(
+    r"(%s)=\((%s),(%s)\)(?:,|(?=\]))" % (NAME, NUMBER, NUMBER) +
+    r"|(%s)=\((%s),\[" % (NAME, NUMBER) +
+    r"|(\]\))(?:,|(?=\]))" +
+    r"|(%s)=\[" % NAME +
+    r"|(\])(?:,(?=[a-zA-Z])|(?=\)))" +
+    r"|([()])")
+
+# Two names or numbers only separated by whitespace, which removing the
+# whitespace would join into one.
+SPLIT_TOKEN_RE = re.compile(r"[\w.%-][\s+]+[\w.%-]")
+
+class LotteryScanError(Exception):
+    pass
+
+class LazyLottery:
+    """
+    A lottery whose tasks are only built when they are used. The source is
+    scanned once to find where each task is and to compute its pondered
+    value and worst case, without building any Outcome. The Task (and its
+    outcomes) is built from its part of the text the first time it is
+    accessed through tasks, e.g. when an agent senses one of its outcomes.
+
+    It can be used anywhere a Lottery is expected. Building a task logs
+    it in changes (see ChangeLog), since its values are no longer those
+    of the scan once it can change.
+    """
+
+    def __init__(self, source):
+        if not isinstance(source, str):
+            source = source.read()
+        # Whitespace (and "+") carry no meaning in the lottery language.
+        self.text = re.sub(r"[\s+]", "", source)
+        self.ranges = {}
+        self.aggregates = {}
+        self.materialized = {}
+        self.tasks = LazyTasks(self)
+        self.owner = object()
+        self.changes = ChangeLog()
+        try:
+            if SPLIT_TOKEN_RE.search(source): raise LotteryScanError()
+            self._scan()
+        except LotteryScanError:
+            # Let the parser point at the error.
+            LotteryParser(source).parse()
+            raise ValueError("Malformed lottery")
+
+    def _scan(self):
+        # Each open task or outcome list has a frame with the sums needed to
+        # aggregate its outcomes: [hard evidence pondered value, occurrences,
+        # belief pondered value, probability, worst case, names, weight].
+        text = self.text
+        match = SCAN_RE.match
+        m = match(text, 0)
+        if m is None or m.group(9) != "(":
+            raise LotteryScanError()
+        pos = m.end()
+        stack = []
+        while True:
+            m = match(text, pos)
+            if m is None:
+                raise LotteryScanError()
+            pos = m.end()
+            kind = m.lastindex
+            if kind == 3:
+                if not stack: raise LotteryScanError()
+                name, weight, value = m.group(1, 2, 3)
+                weight = to_number(weight)
+                value = to_number(value)
+                fold(stack[-1], name, value * weight, weight, value)
+            elif kind == 5:
+                if not stack: raise LotteryScanError()
+                stack.append([0, 0, 0, 0, None, set(), to_number(m.group(5)), m.group(4)])
+            elif kind == 6:
+                if len(stack) < 2: raise LotteryScanError()
+                frame = stack.pop()
+                weight = frame[6]
+                if frame[4] is None:
+                    # An empty list of outcomes, which is worth 0.
+                    pondered, worst = 0 * weight, 0
+                else:
+                    pondered, worst = aggregate(frame), frame[4]
+                if frame[5] is None: stack[-1][5] = None
+                else: fold(stack[-1], frame[7], pondered, weight, worst)
+            elif kind == 7:
+                if stack: raise LotteryScanError()
+                task = m.group(7)
+                start = m.start()
+                stack.append([0, 0, 0, 0, None, set(), None, task])
+            elif kind == 8:
+                if len(stack) != 1: raise LotteryScanError()
+                frame = stack.pop()
+                self.ranges[task] = (start, m.start() + 1)
+                pondered = aggregate(frame) if frame[4] is not None else None
+                if pondered is None or frame[5] is None:
+                    # Left for the Task to evaluate (or to fail).
+                    self.aggregates[task] = None
+                else:
+                    self.aggregates[task] = (pondered, frame[4])
+            elif m.group(9) == ")" and not stack and pos == len(text):
+                return
+            else:
+                raise LotteryScanError()
+
+    def materialize(self, name):
+        task = self.materialized.get(name)
+        if task is None:
+            start, end = self.ranges[name]
+            structure = LotteryParser("(" + self.text[start:end] + ")").parse()
+            task = self.materialized[name] = Task(name, structure[name], {})
+            task.owner = self.owner
+            task.changes = self.changes
+            self.changes.add(name)
+        return task
+
+    def fork(self):
+        # Like Lottery.fork, the tasks built so far are shared until they
+        # are changed, and the text and its index are never changed.
+        lottery = LazyLottery.__new__(LazyLottery)
+        lottery.text = self.text
+        lottery.ranges = self.ranges
+        lottery.aggregates = self.aggregates
+        lottery.materialized = dict(self.materialized)
+        lottery.tasks = LazyTasks(lottery)
+        lottery.owner = object()
+        lottery.changes = ChangeLog()
+        self.owner = object()
+        return lottery
+
+    def unshare_task(self, name):
+        task = self.materialize(name)
+        if task.owner is not self.owner:
+            task = task.copy()
+            task.owner = self.owner
+            task.changes = self.changes
+            self.materialized[name] = task
+        return task
+
+    def calculate_pondered_values(self):
+        vals = {}
+        for k in self.ranges:
+            if k not in self.materialized and self.aggregates[k] is not None:
+                vals[k] = self.aggregates[k][0]
+            else:
+                vals[k] = self.materialize(k).calculate_pondered_value()
+        return vals
+
+    def calculate_worst_cases(self):
+        vals = {}
+        for k in self.ranges:
+            if k not in self.materialized and self.aggregates[k] is not None:
+                vals[k] = self.aggregates[k][1]
+            else:
+                vals[k] = self.materialize(k).calculate_worst_case()
+        return vals
+
+def fold(frame, name, pondered, weight, worst):
+    # Adds an outcome to the frame of its list, like aggregate_outcomes.
+    if frame[5] is None:
+        return
+    if name in frame[5]:
+        # A repeated name replaces the earlier outcome, leave that to Task.
+        frame[5] = None
+        return
+    frame[5].add(name)
+    if weight < 1:
+        frame[2] += pondered
+        frame[3] += weight
+    else:
+        frame[0] += pondered
+        frame[1] += weight
+    if frame[4] is None or worst < frame[4]:
+        frame[4] = worst
+
+def aggregate(frame):
+    if frame[1] != 0: return frame[0] / frame[1]
+    if frame[3] != 0: return frame[2] / frame[3]
+    # Dividing by zero is left for the Task to fail.
+    frame[5] = None
+    return 0
+
+class LazyTasks(Mapping):
+    """
+    A name -> Task mapping over the tasks of a lazy lottery, building them
+    as they are looked up.
+    """
+
+    def __init__(self, lottery):
+        self.lottery = lottery
+
+    def __getitem__(self, name):
+        if name not in self.lottery.ranges:
+            raise KeyError(name)
+        return self.lottery.materialize(name)
+
+    def __contains__(self, name):
+        return name in self.lottery.ranges
+
+    def __iter__(self):
+        return iter(self.lottery.ranges)
+
+    def __len__(self):
+        return len(self.lottery.ranges)
@@ -1,28 +1,201 @@
 import re
+import copy
+from collections import OrderedDict
+from decimal import Decimal
 
 # ===
 # Internal Lottery Implementation:
 # ===
 
+def aggregate_outcomes(outcomes):
+    # Returns the pondered value and the worst case of a node from those of
+    # its (already evaluated) outcomes. Hard evidence (observed occurrences)
+    # always overrides beliefs (probabilities): once an outcome with
+    # occurrences is seen, the outcomes that only carry a probability are
+    # ignored.
+    has_hard_evidence = False
+    pond_value = 0
+    occs = 0
+    worst = None
+    for outcome in outcomes:
+        if worst is None or outcome._worst_case < worst:
+            worst = outcome._worst_case
+        if outcome.occurrences == 0:
+            if not has_hard_evidence:
+                pond_value += outcome._pondered_value
+                occs += outcome.probability
+        else:
+            if not has_hard_evidence:
+                has_hard_evidence = True
+                pond_value = outcome._pondered_value
+                occs = outcome.occurrences
+            else:
+                pond_value += outcome._pondered_value
+                occs += outcome.occurrences
+    return pond_value / occs, worst
+
+def evaluate_outcomes(outcomes):
+    """
+    Computes the pondered value and the worst case of the given outcomes
+    and of every outcome below them that isn't cached, in one post-order
+    traversal. An explicit stack is used instead of recursion, so the depth
+    of a lottery is only limited by memory.
+    """
+    stack = [(outcome, False) for outcome in outcomes if outcome._pondered_value is None]
+    while stack:
+        outcome, expanded = stack.pop()
+        if outcome._pondered_value is not None:
+            continue
+        if not outcome.children:
+            if outcome.occurrences == 0: outcome._pondered_value = outcome.value * outcome.probability
+            else: outcome._pondered_value = outcome.value * outcome.occurrences
+            if outcome.estimator is None: outcome._worst_case = outcome.value
+            else: outcome._worst_case = outcome.estimator.worst
+        elif expanded:
+            outcome._pondered_value, outcome._worst_case = aggregate_outcomes(outcome.children.values())
+        else:
+            stack.append((outcome, True))
+            for child in outcome.children.values():
+                if child._pondered_value is None:
+                    stack.append((child, False))
+
+def build_outcomes(info, parent, table=None):
+    """
+    Builds the outcomes described by info (a name -> (weight, content)
+    dict) under parent and returns them by name.
+    
+    Given a table, structurally identical subtrees are only built once and
+    shared (see Outcome.shared), the table remembering the subtrees built
+    so far. The outcomes are built children first, with an explicit stack.
+    """
+    outcomes = {}
+    stack = [(None, None, outcomes, iter(info.items()))]
+    while stack:
+        name, node_info, children, pending = stack[-1]
+        for k, child_info in pending:
+            if isinstance(child_info[1], dict):
+                stack.append((k, child_info, {}, iter(child_info[1].items())))
+                break
+            children[k] = make_outcome(k, child_info, {}, table)
+        else:
+            stack.pop()
+            if stack: stack[-1][2][name] = make_outcome(name, node_info, children, table)
+    for outcome in outcomes.values():
+        if not outcome.shared: outcome.parent = parent
+    return outcomes
+
+def make_outcome(name, info, children, table):
+    if table is not None:
+        # The children are already unique, so they are compared by identity.
+        content = None if isinstance(info[1], dict) else info[1]
+        key = (name, info[0], content) + tuple(map(id, children.values()))
+        outcome = table.get(key)
+        if outcome is not None:
+            outcome.shared = True
+            outcome.parent = None
+            return outcome
+    outcome = Outcome.__new__(Outcome)
+    outcome._init(name, info, None)
+    outcome.children = children
+    for child in children.values():
+        if not child.shared: child.parent = outcome
+    if table is not None:
+        table[key] = outcome
+    return outcome
+
+def unshare(parent, outcomes, name):
+    # Copy on write: replaces a shared outcome by a private copy (sharing
+    # the same children) before it's changed.
+    outcome = outcomes[name]
+    if outcome.shared:
+        outcome = outcome.copy()
+        outcome.parent = parent
+        outcomes[name] = outcome
+    return outcome
+
+def share(outcomes):
+    # Marks outcomes that are about to be used in more than one place.
+    for outcome in outcomes:
+        outcome.shared = True
+        outcome.parent = None
+
+class ChangeLog:
+    """
+    The tasks of a lottery whose values changed, in the order of their last
+    change. Every change gets the next version, so whoever remembers the
+    version it last saw can read only the tasks changed since, in time
+    proportional to their number.
+    """
+    
+    def __init__(self):
+        self.version = 0
+        self.tasks = OrderedDict()
+    
+    def add(self, name):
+        self.version += 1
+        self.tasks[name] = self.version
+        self.tasks.move_to_end(name)
+    
+    def changed_since(self, version):
+        changed = []
+        for name in reversed(self.tasks):
+            if self.tasks[name] <= version: break
+            changed.append(name)
+        return changed
+
 class Outcome:
     """
     This represents an outcome from a task.
+    
+    The pondered value and the worst case are cached, and only the
+    path from a changed outcome up to its task is invalidated, so
+    evaluating a lottery after an observation costs O(depth).
+    
+    A shared outcome is part of a subtree used in several places of a
+    lottery. It has no parent and must not be changed; unshare_child (or
+    Task.unshare_outcome) gives a private copy that can be.
+    
+    The values observed for an outcome go through its estimator, if it has
+    one (see estimators.py), which then gives its value, its occurrences
+    and its worst case, so an outcome observed often weighs more in its
+    task than one observed once.
     """
     
-    def __init__(self, name, info):
+    def __init__(self, name, info, parent=None):
+        self._init(name, info, parent)
+        if isinstance(info[1], dict):
+            self.children = build_outcomes(info[1], self)
+    
+    def _init(self, name, info, parent):
         self.name = name;
+        self.parent = parent
+        self.shared = False
+        self.estimator = None
         self.occurrences = 0
         self.probability = 0
         self.value = 0
         self.children = {}
+        self._pondered_value = None
+        self._worst_case = None
         if info[0] < 1: self.probability = info[0]
         else: self.occurrences = info[0]
-        
-        if isinstance(info[1], dict):
-            for k in info[1]:
-                self.children[k] = Outcome(k, info[1][k])
         if isinstance(info[1], int) or isinstance(info[1], float):
             self.value = info[1]
+    
+    def copy(self):
+        # A private copy of this outcome, its children are not copied but
+        # shared with this one.
+        outcome = Outcome.__new__(Outcome)
+        outcome.__dict__.update(self.__dict__)
+        outcome.shared = False
+        outcome.parent = None
+        outcome.children = dict(self.children)
+        share(self.children.values())
+        if self.estimator is not None: outcome.estimator = copy.copy(self.estimator)
+        return outcome
+    
+    def unshare_child(self, name):
+        return unshare(self, self.children, name)
                 
     def is_composite(self):
         return len(self.children) > 0
@@ -30,87 +203,147 @@ class Outcome:
     def is_belief(self):
         return self.occurrences == 0
     
-    def calculate_pondered_value(self):
-        if not self.is_composite():
-            if self.is_belief(): return self.value * self.probability
-            else: return self.value * self.occurrences
+    def set_value(self, value):
+        if self.shared: raise ValueError("outcome %s is shared, unshare it first" % self.name)
+        self.value = value
+        self.invalidate()
+    
+    def observe(self, value):
+        # Without an estimator an observed value replaces the current one,
+        # and the outcome keeps its occurrences.
+        if self.estimator is None:
+            self.set_value(value)
         else:
-            has_hard_evidence = False
-            comp_value = 0
-            occs = 0
-            for child in self.children.values():
-                if child.is_belief():
-                    if not has_hard_evidence:
-                        comp_value += child.calculate_pondered_value()
-                        occs += child.probability
-                else:
-                    if not has_hard_evidence:
-                        has_hard_evidence = True
-                        comp_value = child.calculate_pondered_value()
-                        occs = child.occurrences
-                    else:
-                        comp_value += child.calculate_pondered_value()
-                        occs += child.occurrences
-            return comp_value / occs
+            self.estimator.update(value)
+            self.set_value(self.estimator.value)
+            self.occurrences = self.estimator.weight
+        
+    def add_child(self, outcome):
+        if self.shared: raise ValueError("outcome %s is shared, unshare it first" % self.name)
+        outcome.parent = self
+        self.children[outcome.name] = outcome
+        self.invalidate()
+    
+    def invalidate(self):
+        # A cached ancestor is only ever valid if all of its descendants
+        # are, so we can stop at the first node that is already dirty.
+        node = self
+        while node is not None and node._pondered_value is not None:
+            node._pondered_value = None
+            node._worst_case = None
+            node = node.parent
+            if isinstance(node, Task):
+                node.invalidate()
+                break
+    
+    def calculate_pondered_value(self):
+        if self._pondered_value is None:
+            evaluate_outcomes((self,))
+        return self._pondered_value
         
     def calculate_worst_case(self):
-        if not self.is_composite():
-            return self.value
-        v = self.children.values()[0].calculate_worst_case()
-        for child in self.children.values()[1:]:
-            cv = child.calculate_worst_case() 
-            if cv < v:
-                v = cv
-        return v
+        if self._worst_case is None:
+            evaluate_outcomes((self,))
+        return self._worst_case
             
                 
 class Task:
     """
     This represents a task that an agent can execute.
+    
+    When its cached values are invalidated, the task is added to the
+    change log of its lottery, if it has one.
     """
     
-    def __init__(self, name, info):
+    def __init__(self, name, info, table=None):
         self.name = name;
-        self.outcomes = {}
-        for k in info:
-            self.outcomes[k] = Outcome(k, info[k])
+        self.parent = None
+        self._pondered_value = None
+        self._worst_case = None
+        self.owner = None
+        self.changes = None
+        self.outcomes = build_outcomes(info, self, table)
+    
+    def copy(self):
+        # A copy of this task, its outcomes are shared with this one.
+        task = Task.__new__(Task)
+        task.__dict__.update(self.__dict__)
+        task.outcomes = dict(self.outcomes)
+        share(self.outcomes.values())
+        return task
+    
+    def unshare_outcome(self, name):
+        return unshare(self, self.outcomes, name)
+    
+    def add_outcome(self, outcome):
+        outcome.parent = self
+        self.outcomes[outcome.name] = outcome
+        self.invalidate()
+        
+    def invalidate(self):
+        # A task that is already dirty was logged when it became dirty.
+        if self._pondered_value is not None and self.changes is not None:
+            self.changes.add(self.name)
+        self._pondered_value = None
+        self._worst_case = None
+    
+    def evaluate(self):
+        evaluate_outcomes(self.outcomes.values())
+        self._pondered_value, self._worst_case = aggregate_outcomes(self.outcomes.values())
         
     def calculate_pondered_value(self):
-        has_hard_evidence = False
-        pond_value = 0
-        occs = 0
-        for outcome in self.outcomes.values():
-            if outcome.is_belief():
-                if not has_hard_evidence:
-                    pond_value += outcome.calculate_pondered_value()
-                    occs += outcome.probability
-            else:
-                if not has_hard_evidence:
-                    has_hard_evidence = True
-                    pond_value = outcome.calculate_pondered_value()
-                    occs = outcome.occurrences
-                else:
-                    pond_value += outcome.calculate_pondered_value()
-                    occs += outcome.occurrences
-        return pond_value / occs
+        if self._pondered_value is None:
+            self.evaluate()
+        return self._pondered_value
     
     def calculate_worst_case(self):
-        v = list(self.outcomes.values())[0].calculate_worst_case()
-        for outcome in list(self.outcomes.values())[1:]:
-            cv = outcome.calculate_worst_case() 
-            if cv < v:
-                v = cv
-        return v        
+        if self._worst_case is None:
+            self.evaluate()
+        return self._worst_case
             
 class Lottery:
     """
     This represents a lottery of actions and outcomes that may be preformed by an agent.
+    
+    Unless share is False, identical outcome subtrees (in the same or in
+    different tasks) are built, and evaluated, only once.
+    
+    A lottery can be forked in O(1) (plus copying the task dict): the fork
+    shares every task and outcome with it, and either lottery copies a
+    task, and the outcomes on the way to the one it changes, on write.
+    A task belongs to the lottery whose owner token it has; the tokens
+    of both lotteries are renewed on fork, so that all tasks are shared.
+    
+    The tasks whose values change are logged in changes (see ChangeLog).
     """
     
-    def __init__(self, info):
+    def __init__(self, info, share=True):
         self.tasks = {}
+        self.owner = object()
+        self.changes = ChangeLog()
+        table = {} if share else None
         for k in info:
-            self.tasks[k] = Task(k, info[k])
+            self.tasks[k] = Task(k, info[k], table)
+            self.tasks[k].owner = self.owner
+            self.tasks[k].changes = self.changes
+    
+    def fork(self):
+        lottery = Lottery.__new__(Lottery)
+        lottery.tasks = dict(self.tasks)
+        lottery.owner = object()
+        lottery.changes = ChangeLog()
+        self.owner = object()
+        return lottery
+    
+    def unshare_task(self, name):
+        # Copy on write for tasks, see fork.
+        task = self.tasks[name]
+        if task.owner is not self.owner:
+            task = task.copy()
+            task.owner = self.owner
+            task.changes = self.changes
+            self.tasks[name] = task
+        return task
             
     def calculate_pondered_values(self):
         vals = {}
@@ -124,16 +357,231 @@ class Lottery:
             vals[k] = self.tasks[k].calculate_worst_case()
         return vals
 
-def parse_lottery(s):
-    # This is just a hack so that I don't have to waste time writting a parser for the lottery
-    # language. Please don't judge me.
-    
-    prepared_s = re.sub(r"[\s+]", "", s)
-    prepared_s = "{" + prepared_s[1:-1] + "}"
-    prepared_s = re.sub(r"\[", "{", prepared_s)
-    prepared_s = re.sub(r"\]", "}", prepared_s)
-    prepared_s = re.sub(r"\=", ":", prepared_s)
-    prepared_s = re.sub(r"[a-zA-Z]\w*(\|[a-zA-Z]\w*)*", lambda m: "\"" + m.group() + "\"", prepared_s)
-    prepared_s = re.sub(r"\d+(\.\d+)?%", lambda m: str(float(m.group()[:-1]) / 100), prepared_s)
-    structure = eval(prepared_s)
-    return Lottery(structure)
+# ===
+# Lottery Language Parser:
+# ===
+
+class LotteryParseError(ValueError):
+    """
+    Raised when a lottery does not follow the lottery language.
+    """
+    
+    def __init__(self, message, offset, line, column):
+        ValueError.__init__(self, "%s (line %d, column %d)" % (message, line, column))
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+class LotteryTokenizer:
+    """
+    Splits a lottery, given as a string or a file-like object, into tokens.
+    The input is read in chunks, so it never has to be fully in memory.
+    """
+    
+    # Whitespace (and "+", which the language ignores) is skipped, and any
+    # other unexpected character becomes a token of its own.
+    TOKEN_RE = re.compile(r"[\s+]*([a-zA-Z]\w*(?:\|[a-zA-Z]\w*)*|-?\d+(?:\.\d+)?%?|[^\s+])")
+    
+    def __init__(self, source, chunk_size=1 << 16):
+        if isinstance(source, str):
+            self.read = iter((source, "")).__next__
+        else:
+            self.read = lambda: source.read(chunk_size)
+        self.buf = ""
+        self.eof = False
+        self.segment = ""
+        self.base = 0
+        self.line = 1
+        self.line_start = 0
+        
+    def next_segment(self):
+        # Returns the tokens of the next part of the input, cut after the
+        # last delimiter read so far so that no token is split in two. The
+        # end of the input is the empty token "".
+        while True:
+            if self.eof:
+                cut = len(self.buf)
+            else:
+                chunk = self.read()
+                self.eof = not chunk
+                self.buf += chunk
+                cut = max(self.buf.rfind(")"), self.buf.rfind(","), self.buf.rfind("]")) + 1
+                if cut == 0 and not self.eof: continue
+            self.base += len(self.segment)
+            newlines = self.segment.count("\n")
+            if newlines:
+                self.line += newlines
+                self.line_start = self.base - len(self.segment) + self.segment.rindex("\n") + 1
+            self.segment, self.buf = self.buf[:cut], self.buf[cut:]
+            tokens = self.TOKEN_RE.findall(self.segment)
+            if self.eof and not self.buf:
+                tokens.append("")
+            if tokens:
+                return tokens
+            
+    def error(self, message, index):
+        # Positions are only worked out when reporting an error.
+        offset = len(self.segment)
+        for i, m in enumerate(self.TOKEN_RE.finditer(self.segment)):
+            if i == index:
+                offset = m.start(1)
+                break
+        line = self.line + self.segment.count("\n", 0, offset)
+        line_start = self.line_start
+        if line > self.line:
+            line_start = self.base + self.segment.rindex("\n", 0, offset) + 1
+        offset += self.base
+        raise LotteryParseError(message, offset, line, offset - line_start + 1)
+
+NAME_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+NUMBER_START = frozenset("-0123456789")
+
+def to_number(text):
+    # Numbers followed by "%" are percentages.
+    if text[-1] == "%": return float(text[:-1]) / 100
+    if "." in text: return float(text)
+    return int(text)
+
+class LotteryParser:
+    """
+    A single pass parser for the lottery language:
+    
+        lottery  := "(" [task ("," task)*] ")"
+        task     := NAME "=" "[" [outcome ("," outcome)*] "]"
+        outcome  := NAME "=" "(" NUMBER "," (NUMBER | "[" [outcome ("," outcome)*] "]") ")"
+    
+    Numbers followed by "%" are percentages. It produces the same nested
+    structure that Lottery and Task are built from. Nested outcome lists
+    are handled with an explicit stack, so arbitrarily deep lotteries can
+    be parsed.
+    """
+    
+    def __init__(self, source):
+        self.tokenizer = LotteryTokenizer(source)
+        self.tokens = []
+        self.index = 0
+        self.advance()
+        
+    def advance(self):
+        self.index += 1
+        if self.index >= len(self.tokens):
+            self.tokens = self.tokenizer.next_segment()
+            self.index = 0
+        self.token = self.tokens[self.index]
+        
+    def error(self, expected):
+        found = repr(self.token) if self.token else "end of input"
+        self.tokenizer.error("Expected %s but found %s" % (expected, found), self.index)
+        
+    def expect(self, symbol):
+        if self.token != symbol: self.error(repr(symbol))
+        self.advance()
+        
+    def accept(self, symbol):
+        if self.token != symbol: return False
+        self.advance()
+        return True
+    
+    def name(self):
+        name = self.token
+        if not name or name[0] not in NAME_START: self.error("a name")
+        self.advance()
+        return name
+    
+    def number(self):
+        text = self.token
+        if not text or text[0] not in NUMBER_START or text == "-": self.error("a number")
+        self.advance()
+        return to_number(text)
+    
+    def parse(self):
+        structure = {}
+        self.expect("(")
+        if self.token != ")":
+            while True:
+                name = self.name()
+                self.expect("=")
+                structure[name] = self.outcomes()
+                if not self.accept(","): break
+        self.expect(")")
+        if self.token: self.error("end of input")
+        return structure
+    
+    def outcomes(self):
+        self.expect("[")
+        root = {}
+        stack = [root]
+        while stack:
+            if self.token != "]":
+                name = self.name()
+                self.expect("=")
+                self.expect("(")
+                weight = self.number()
+                self.expect(",")
+                if self.accept("["):
+                    children = {}
+                    stack[-1][name] = (weight, children)
+                    stack.append(children)
+                    continue
+                stack[-1][name] = (weight, self.number())
+                self.expect(")")
+                if self.accept(","): continue
+            # Close every outcome list that ends here.
+            while True:
+                self.expect("]")
+                stack.pop()
+                if not stack: break
+                self.expect(")")
+                if self.accept(","): break
+        return root
+
+def parse_lottery(s, factory=Lottery):
+    """
+    Builds a lottery from its textual form, given as a string or as a
+    file-like object.
+    """
+    return factory(LotteryParser(s).parse())
+
+# ===
+# Lottery Language Writer:
+# ===
+
+def format_number(x):
+    # The shortest text that reads back as x, without an exponent, which
+    # the lottery language doesn't have.
+    if x == int(x) and abs(x) < 1e16: return "%d" % x
+    text = repr(x)
+    if "e" in text or "E" in text: text = format(Decimal(text), "f")
+    return text
+
+def format_lottery(lottery):
+    """
+    Writes a lottery (of any kind) back in the lottery language, so that
+    parsing the text gives the same lottery.
+    """
+    parts = ["("]
+    for i, name in enumerate(lottery.tasks):
+        if i > 0: parts.append(", ")
+        parts.append(name + "=[")
+        stack = [iter(lottery.tasks[name].outcomes.values())]
+        first = True
+        while stack:
+            outcome = next(stack[-1], None)
+            if outcome is None:
+                stack.pop()
+                parts.append("])" if stack else "]")
+                first = False
+                continue
+            if not first: parts.append(",")
+            first = True
+            if outcome.occurrences == 0: weight = outcome.probability
+            else: weight = outcome.occurrences
+            parts.append("%s=(%s," % (outcome.name, format_number(weight)))
+            if outcome.children:
+                parts.append("[")
+                stack.append(iter(outcome.children.values()))
+            else:
+                parts.append(format_number(outcome.value) + ")")
+                first = False
+    parts.append(")")
+    return "".join(parts)
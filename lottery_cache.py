@@ -0,0 +1,135 @@
+import os
+import mmap
+import struct
+import pickle
+import hashlib
+from collections import OrderedDict
+from lottery import *
+
+# ===
+# Parsed Lottery Cache:
+# ===
+
+class LotteryStore:
+    """
+    An append-only file of parsed lottery structures, keyed by the hash of
+    their text. The file is memory-mapped, so a structure is only read and
+    unpickled when it is asked for.
+
+    Each record is a 20 byte key, a 4 byte length and the pickled structure.
+    """
+
+    RECORD_HEADER = struct.Struct("<20sI")
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.file = open(path, "ab")
+        self.map = None
+        self.size = 0
+        self._load_index()
+
+    def _remap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.size = os.path.getsize(self.path)
+        if self.size > 0:
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_index(self):
+        self._remap()
+        offset = 0
+        while offset + self.RECORD_HEADER.size <= self.size:
+            key, length = self.RECORD_HEADER.unpack_from(self.map, offset)
+            start = offset + self.RECORD_HEADER.size
+            if start + length > self.size:
+                break # A record cut short by a crash, ignore it.
+            self.index[key] = (start, length)
+            offset = start + length
+        if offset < self.size:
+            self.map.close()
+            self.map = None
+            self.file.truncate(offset)
+            self._remap()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, key):
+        if key not in self.index:
+            return None
+        start, length = self.index[key]
+        if start + length > self.size:
+            self._remap()
+        return pickle.loads(self.map[start:start + length])
+
+    def put(self, key, structure):
+        if key in self.index:
+            return
+        payload = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(self.RECORD_HEADER.pack(key, len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        self.index[key] = (offset + self.RECORD_HEADER.size, len(payload))
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+class LotteryCache:
+    """
+    Sits in front of parse_lottery and remembers the parsed structure of
+    the lotteries it has seen, in memory (LRU) and, when given a path, in
+    a LotteryStore on disk that is shared between sessions.
+
+    Lotteries are mutated by the agents that sense, so every call still
+    builds a fresh lottery; only the parsing is skipped.
+    """
+
+    def __init__(self, path=None, capacity=128):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.store = LotteryStore(path) if path is not None else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(s):
+        # Whitespace (and "+") carry no meaning in the lottery language
+        # apart from separating tokens, so the key is the tokens of s.
+        return hashlib.sha1(" ".join(LotteryTokenizer.TOKEN_RE.findall(s)).encode()).digest()
+
+    def parse(self, s, factory=Lottery):
+        key = self.key(s)
+        structure = self.entries.get(key)
+        if structure is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return factory(structure)
+
+        if self.store is not None and key in self.store:
+            self.disk_hits += 1
+            structure = self.store.get(key)
+        else:
+            self.misses += 1
+            structure = LotteryParser(s).parse()
+            if self.store is not None:
+                self.store.put(key, structure)
+
+        self.entries[key] = structure
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return factory(structure)
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,134 @@
+import sys
+import mmap
+import struct
+from array import array
+from lottery import *
+from compact_lottery import *
+from mapped_columns import *
+
+# ===
+# Binary Lottery Files:
+# ===
+
+# A lottery file holds the columns of a CompactLottery as they are in
+# memory, so that it can be memory-mapped and evaluated without reading
+# every node first:
+#
+#   header        magic, version, byte order, counts (HEADER)
+#   float64[n]    occurrences, probability, value
+#   int32[n]      parent, first_child, last_child, next_sibling, name
+#   int32[tasks]  the node of each task, in order
+#   uint32[names + 1] the offset of each name in the pool (pack_names)
+#   bytes         the pool of UTF-8 encoded names
+#
+# The float columns come first so that they are 8 byte aligned.
+
+MAGIC = b"LOTB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIII")
+
+FLOAT_COLUMNS = ("occurrences", "probability", "value")
+INT_COLUMNS = ("parent", "first_child", "last_child", "next_sibling", "name")
+
+def write_lottery(lottery, path):
+    """
+    Writes a lottery (of any kind) to a binary lottery file.
+    """
+    with open(path, "wb") as f:
+        dump_lottery(lottery, f)
+
+def dump_lottery(lottery, f):
+    # Writes a lottery file at the current position of f, which must be a
+    # multiple of 8 for the columns to be aligned.
+    if not isinstance(lottery, CompactLottery):
+        lottery = CompactLottery.from_lottery(lottery)
+    offsets, pool = pack_names(lottery.names)
+    f.write(HEADER.pack(MAGIC, VERSION, native_byte_order(),
+                        len(lottery), len(lottery.task_index), len(lottery.names), len(pool)))
+    for column in FLOAT_COLUMNS + INT_COLUMNS:
+        f.write(getattr(lottery, column))
+    f.write(array('i', lottery.task_index.values()))
+    f.write(offsets)
+    f.write(pool)
+
+def load_lottery(path):
+    return MappedLottery(path)
+
+class MappedLottery(CompactLottery, MappedColumns):
+    """
+    A compact lottery whose columns are a private (copy on write) memory
+    map of a binary lottery file. Loading only reads the header, the tasks
+    and the names, and the evaluation reads the columns from the map.
+
+    Changing values doesn't change the file. Adding outcomes copies the
+    columns into memory first.
+
+    The lottery file can also be part of a bigger file, starting at offset.
+    """
+
+    def __init__(self, path, offset=0):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, byte_order, n, n_tasks, n_names, pool_size = HEADER.unpack_from(self.map, offset)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError("%s is not a lottery file" % path)
+
+        self.views = []
+        self.byte_order = byte_order
+        offset += HEADER.size
+        for column in FLOAT_COLUMNS:
+            setattr(self, column, self._column(offset, 'd', n))
+            offset += 8 * n
+        for column in INT_COLUMNS:
+            setattr(self, column, self._column(offset, 'i', n))
+            offset += 4 * n
+        task_nodes = self._column(offset, 'i', n_tasks)
+        offset += 4 * n_tasks
+
+        self.names = []
+        self.name_ids = {}
+        for name in self._names(offset, n_names, pool_size):
+            self.intern(name)
+        self.pondered = array('d', bytes(8 * n))
+        self.worst = array('d', bytes(8 * n))
+        self.task_index = {}
+        for node in task_nodes:
+            self.task_index[self.names[self.name[node]]] = node
+        self.tasks = CompactTasks(self)
+        self._evaluated = False
+        self._dirty = set()
+        self.estimators = {}
+        self.changes = ChangeLog()
+
+    def _detach(self):
+        # Copies the mapped columns into arrays, which can grow.
+        for column in FLOAT_COLUMNS + INT_COLUMNS:
+            view = getattr(self, column)
+            if isinstance(view, memoryview):
+                setattr(self, column, copy_column(view))
+
+    def _append_node(self, name, occurrences, probability, value, parent):
+        if isinstance(self.parent, memoryview):
+            self._detach()
+        return CompactLottery._append_node(self, name, occurrences, probability, value, parent)
+
+    def close(self):
+        self._detach()
+        MappedColumns.close(self)
+
+if __name__ == "__main__":
+    # Converts between the lottery language and binary lottery files:
+    #   python lottery_file.py pack lottery.txt lottery.lotb
+    #   python lottery_file.py unpack lottery.lotb lottery.txt
+    if len(sys.argv) != 4 or sys.argv[1] not in ("pack", "unpack"):
+        sys.exit("usage: lottery_file.py pack|unpack <input> <output>")
+    command, source, target = sys.argv[1:]
+    if command == "pack":
+        with open(source) as f:
+            write_lottery(CompactLottery(LotteryParser(f).parse()), target)
+    else:
+        lottery = load_lottery(source)
+        with open(target, "w") as f:
+            f.write(format_lottery(lottery))
+        lottery.close()
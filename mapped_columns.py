@@ -0,0 +1,61 @@
+import sys
+from array import array
+
+# ===
+# Mapped Columns:
+# ===
+
+# What the memory-mapped file formats (lottery files and payoff stores)
+# share: their columns are arrays written in the byte order of the writer,
+# whose index in BYTE_ORDERS is in the header, and their names are a pool
+# of UTF-8 encoded strings after the offset of each of them:
+#
+#   uint32[names + 1] the offset of each name in the pool
+#   bytes             the pool of UTF-8 encoded names
+
+BYTE_ORDERS = ("little", "big")
+
+def native_byte_order():
+    return BYTE_ORDERS.index(sys.byteorder)
+
+def pack_names(names):
+    """
+    The offsets (an array) and the pool (bytes) of a list of names, to be
+    written one after the other.
+    """
+    names = [name.encode() for name in names]
+    offsets = array('I', [0])
+    for name in names:
+        offsets.append(offsets[-1] + len(name))
+    return offsets, b"".join(names)
+
+class MappedColumns:
+    """
+    Reads the columns of a file from a memory map, self.map, written in the
+    byte order self.byte_order. A column in the native byte order is a view
+    of the map, and one in the other byte order is a swapped copy.
+    """
+
+    def _column(self, offset, typecode, length):
+        size = array(typecode).itemsize * length
+        if BYTE_ORDERS[self.byte_order] != sys.byteorder:
+            column = array(typecode)
+            column.frombytes(self.map[offset:offset + size])
+            column.byteswap()
+            return column
+        view = memoryview(self.map)[offset:offset + size].cast(typecode)
+        self.views.append(view)
+        return view
+
+    def _names(self, offset, count, pool_size):
+        # The names written by pack_names at offset.
+        offsets = self._column(offset, 'I', count + 1).tolist()
+        offset += 4 * (count + 1)
+        pool = self.map[offset:offset + pool_size]
+        return [pool[offsets[i]:offsets[i + 1]].decode() for i in range(count)]
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.map.close()
@@ -0,0 +1,358 @@
+import mmap
+import operator
+import struct
+import itertools
+from array import array
+from bisect import bisect_left
+from games import *
+from mapped_columns import *
+
+# ===
+# Payoff Stores:
+# ===
+
+# A payoff store is a file with the payoffs of every player of a game of n
+# players, memory-mapped so that the payoffs are read where they are used
+# instead of being held as nested lists. A profile (one strategy index per
+# player) is numbered in row-major order, key = sum(index[k] * stride[k]).
+#
+#   header            magic, version, byte order, layout, counts (HEADER)
+#   int64[n]          the number of strategies of each player (the shape)
+#   int64[entries]    the sorted keys of the stored profiles (sparse only)
+#   float64[n][entries] the payoffs of each player, one block per player
+#   uint32[names + 1] the offset of each name in the pool (pack_names)
+#   bytes             the pool of UTF-8 encoded names: the players, then
+#                     the strategies of each player
+#
+# A dense store has every profile, in key order, and a sparse store only
+# those given, the others being worth 0.
+
+PAYOFF_MAGIC = b"PAYS"
+PAYOFF_VERSION = 1
+PAYOFF_HEADER = struct.Struct("<4sHBBHxxQI")
+DENSE, SPARSE = 0, 1
+
+def write_payoff_store(path, players, strategies, entries, sparse=None):
+    """
+    Writes a payoff store. entries maps profiles (tuples of strategy
+    indices) to the list of the payoffs of every player. Unless told
+    otherwise, the store is sparse when that takes less space.
+    """
+    shape = [len(s) for s in strategies]
+    keys = {}
+    for profile in entries:
+        keys[profile_key(profile, shape)] = entries[profile]
+    def block(player):
+        return {key: keys[key][player] for key in keys}
+    write_payoff_blocks(path, players, strategies, keys, block, sparse)
+
+def write_payoff_blocks(path, players, strategies, keys, block, sparse=None):
+    """
+    Writes a payoff store one player at a time, so that only a block of
+    payoffs is in memory. keys are the keys (see profile_key) of the
+    profiles with payoffs, and block(player) maps them to the payoffs of
+    a player (its index), 0 if missing.
+    """
+    n = len(players)
+    shape = [len(s) for s in strategies]
+    size = 1
+    for length in shape:
+        size *= length
+    if sparse is None:
+        sparse = len(keys) * (n + 1) < size * n
+    order = sorted(keys) if sparse else range(size)
+
+    names = list(players)
+    for player_strategies in strategies:
+        names += player_strategies
+    offsets, pool = pack_names(names)
+
+    with open(path, "wb") as f:
+        f.write(PAYOFF_HEADER.pack(PAYOFF_MAGIC, PAYOFF_VERSION, native_byte_order(),
+                                   SPARSE if sparse else DENSE, n, len(order), len(pool)))
+        f.write(array('q', shape))
+        if sparse:
+            f.write(array('q', order))
+        for player in range(n):
+            payoffs = block(player)
+            f.write(array('d', [payoffs.get(key, 0.0) for key in order]))
+        f.write(offsets)
+        f.write(pool)
+
+def write_game(lottery, path, sparse=None):
+    """
+    Writes the payoffs of a game lottery (see GameAgent) to a payoff store,
+    reading the outcomes of one player at a time.
+    """
+    players, strategies, index = game_strategies(lottery)
+    shape = [len(s) for s in strategies]
+    def outcome_keys(player):
+        outcomes = lottery.tasks[player].outcomes
+        for profile in outcomes:
+            names = profile.split("|")
+            yield profile_key([index[k][names[k]] for k in range(len(names))], shape), outcomes[profile]
+    keys = set()
+    for player in players:
+        keys.update(key for key, outcome in outcome_keys(player))
+    def block(player):
+        return {key: outcome_payoff(outcome) for key, outcome in outcome_keys(players[player])}
+    write_payoff_blocks(path, players, strategies, keys, block, sparse)
+
+def first_payoffs(path):
+    """
+    The structure of a game lottery (see GameAgent) with the payoff of
+    each player for the first profile of a payoff store.
+    """
+    payoffs = PayoffStore(path)
+    try:
+        first = [0] * len(payoffs.players)
+        profile = "|".join(strategies[0] for strategies in payoffs.strategies)
+        return {payoffs.players[p]: {profile: (1, payoffs.payoff(p, first))} for p in range(len(payoffs.players))}
+    finally:
+        payoffs.close()
+
+def profile_key(profile, shape):
+    key = 0
+    for index, length in zip(profile, shape):
+        if not 0 <= index < length:
+            raise IndexError("profile %r is out of range" % (profile,))
+        key = key * length + index
+    return key
+
+class PayoffStore(MappedColumns):
+    """
+    The payoffs of a game, memory-mapped from a payoff store. Opening it
+    only reads the header and the names. A lookup reads one payoff, and a
+    line of payoffs (every strategy of one player, the others fixed) is a
+    strided slice of the map, or a binary search per strategy when sparse.
+
+    A writable store is a private (copy on write) map, whose payoffs can be
+    changed with set_payoff without changing the file. Strategies can be
+    added too, and the payoffs of the profiles the file doesn't have (with
+    a new strategy, or missing from a sparse store) are kept in memory, in
+    added, until the store is written again.
+    """
+
+    def __init__(self, path, writable=False):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+        magic, version, byte_order, layout, n, entries, pool_size = PAYOFF_HEADER.unpack_from(self.map, 0)
+        if magic != PAYOFF_MAGIC or version != PAYOFF_VERSION:
+            self.map.close()
+            raise ValueError("%s is not a payoff store" % path)
+        self.views = []
+        self.byte_order = byte_order
+        offset = PAYOFF_HEADER.size
+        self.stored_shape = self._column(offset, 'q', n).tolist()
+        self.shape = list(self.stored_shape)
+        offset += 8 * n
+        self.sparse = layout == SPARSE
+        self.keys = None
+        if self.sparse:
+            self.keys = self._column(offset, 'q', entries)
+            offset += 8 * entries
+        self.entries = entries
+        self.values = self._column(offset, 'd', n * entries)
+        offset += 8 * n * entries
+        names = self._names(offset, n + sum(self.shape), pool_size)
+
+        self.players = names[:n]
+        self.strategies = []
+        start = n
+        for length in self.shape:
+            self.strategies.append(names[start:start + length])
+            start += length
+        self.strides = [1] * n
+        for k in range(n - 2, -1, -1):
+            self.strides[k] = self.strides[k + 1] * self.stored_shape[k + 1]
+        self.added = {} # profile -> the payoffs of every player
+
+    def key(self, profile):
+        return profile_key(profile, self.stored_shape)
+
+    def position(self, profile):
+        # The position of a profile in the blocks of payoffs, or None if the
+        # file doesn't have it.
+        for index, length, stored in zip(profile, self.shape, self.stored_shape):
+            if not 0 <= index < length:
+                raise IndexError("profile %r is out of range" % (profile,))
+            if index >= stored:
+                return None
+        key = self.key(profile)
+        if not self.sparse:
+            return key
+        position = bisect_left(self.keys, key)
+        if position < self.entries and self.keys[position] == key:
+            return position
+        return None
+
+    def payoff(self, player, profile):
+        """
+        The payoff of a player (its index) for a profile of strategies.
+        """
+        position = self.position(profile)
+        if position is None:
+            payoffs = self.added.get(tuple(profile))
+            return payoffs[player] if payoffs is not None else 0.0
+        return self.values[player * self.entries + position]
+
+    def set_payoff(self, player, profile, value):
+        """
+        Changes the payoff of a player for a profile in a writable store.
+        """
+        position = self.position(profile)
+        if position is None:
+            self.added.setdefault(tuple(profile), [0.0] * len(self.shape))[player] = value
+        else:
+            self.values[player * self.entries + position] = value
+
+    def add_strategy(self, player, name):
+        """
+        Adds a strategy to a player (its index), whose payoffs are 0 until
+        they're set.
+        """
+        self.strategies[player].append(name)
+        self.shape[player] += 1
+
+    def line(self, player, axis, profile):
+        """
+        The payoffs of a player for every strategy of the player axis, the
+        others playing as in profile (whose strategy for axis is ignored).
+        """
+        if not self.added and self.shape == self.stored_shape:
+            return self.stored_line(player, axis, profile)
+        profile = list(profile)
+        profile[axis] = 0
+        length = self.shape[axis]
+        if all(map(operator.lt, profile, self.stored_shape)):
+            line = self.stored_line(player, axis, profile)
+            line += [0.0] * (length - len(line))
+        else:
+            line = [0.0] * length
+        if self.added:
+            for i in range(length):
+                profile[axis] = i
+                payoffs = self.added.get(tuple(profile))
+                if payoffs is not None: line[i] = payoffs[player]
+        return line
+
+    def stored_line(self, player, axis, profile):
+        # The line of payoffs in the file.
+        stride = self.strides[axis]
+        base = self.key(profile) - profile[axis] * stride
+        length = self.stored_shape[axis]
+        if not self.sparse:
+            start = player * self.entries + base
+            return self.values[start:start + stride * length:stride].tolist()
+        keys = self.keys
+        values = self.values
+        block = player * self.entries
+        line = [0.0] * length
+        if stride == 1:
+            # The whole line is a contiguous run of keys.
+            lo = bisect_left(keys, base)
+            hi = bisect_left(keys, base + length, lo)
+            for position in range(lo, hi):
+                line[keys[position] - base] = values[block + position]
+            return line
+        lo = 0
+        for i in range(length):
+            key = base + i * stride
+            lo = bisect_left(keys, key, lo)
+            if lo == self.entries:
+                break
+            if keys[lo] == key: line[i] = values[block + lo]
+        return line
+
+    def matrix(self, player, row_axis, col_axis, profile):
+        """
+        The payoffs of a player for every strategy of the players row_axis
+        and col_axis (a list of rows), the others playing as in profile.
+        This reads every payoff of the matrix, which bimatrix doesn't.
+        """
+        profile = list(profile)
+        rows = []
+        for i in range(self.shape[row_axis]):
+            profile[row_axis] = i
+            rows.append(self.line(player, col_axis, profile))
+        return rows
+
+    def bimatrix(self, row_axis=0, col_axis=1, profile=None, zero_sum=False):
+        """
+        The game between two of the players, the others playing as in
+        profile, e.g. for lemke_howson or eliminate_dominated. It reads the
+        payoffs from the store a line at a time, so it sees the payoffs set
+        since. In a zero-sum game, the payoffs of the column player are
+        the opposite of the row player's.
+        """
+        return StoreBimatrix(self, row_axis, col_axis, profile or [0] * len(self.shape), zero_sum)
+
+    def best_response(self, player, profile):
+        """
+        The strategy of a player with the highest payoff when the others
+        play as in profile.
+        """
+        line = self.line(player, player, profile)
+        return max(range(len(line)), key=line.__getitem__)
+
+    def expected_payoffs(self, player, strategies):
+        """
+        The expected payoff of each strategy of a player when every other
+        player k plays the mixed strategy strategies[k]. The stored
+        payoffs are streamed once, and then the added ones.
+        """
+        n = len(self.shape)
+        expected = [0.0] * self.shape[player]
+        block = player * self.entries
+        if self.sparse:
+            profiles = (self.profile(key) for key in self.keys)
+        else:
+            profiles = itertools.product(*[range(length) for length in self.stored_shape])
+        entries = itertools.chain(zip(profiles, self.values[block:block + self.entries]),
+                                  ((profile, payoffs[player]) for profile, payoffs in self.added.items()))
+        others = [k for k in range(n) if k != player]
+        for profile, value in entries:
+            if value:
+                weight = value
+                for k in others:
+                    weight *= strategies[k][profile[k]]
+                expected[profile[player]] += weight
+        return expected
+
+    def profile(self, key):
+        profile = []
+        for stride in self.strides:
+            index, key = divmod(key, stride)
+            profile.append(index)
+        return profile
+
+class StoreBimatrix(Bimatrix):
+    """
+    A game between two players of a payoff store (see PayoffStore.bimatrix).
+    """
+
+    def __init__(self, store, row_axis, col_axis, profile, zero_sum):
+        self.store = store
+        self.axes = (row_axis, col_axis)
+        self.profile = list(profile)
+        self.zero_sum = zero_sum
+
+    @property
+    def shape(self):
+        # Strategies can be added to the store.
+        return (self.store.shape[self.axes[0]], self.store.shape[self.axes[1]])
+
+    def line(self, player, axis, strategy):
+        # The payoffs of a player for every strategy of one player of the
+        # game (its axis, 0 or 1), the other playing strategy.
+        profile = list(self.profile)
+        profile[self.axes[1 - axis]] = strategy
+        if player == 1 and self.zero_sum:
+            return [-a for a in self.store.line(self.axes[0], self.axes[axis], profile)]
+        return self.store.line(self.axes[player], self.axes[axis], profile)
+
+    def row(self, player, i):
+        return self.line(player, 1, i)
+
+    def column(self, player, j):
+        return self.line(player, 0, j)
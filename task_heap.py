@@ -0,0 +1,98 @@
+import heapq
+
+# ===
+# Task Ranking:
+# ===
+
+class TaskHeap:
+    """
+    An indexed binary max-heap of task names keyed by their value. A task's
+    value can be changed in O(log n), and the best task read in O(1).
+
+    Ties go to the task that was added first, like a linear scan would.
+    """
+
+    def __init__(self, values):
+        self.values = dict(values)
+        self.order = {}
+        for name in self.values:
+            self.order[name] = len(self.order)
+        self.heap = list(self.values)
+        self.position = {}
+        for i in range(len(self.heap)):
+            self.position[self.heap[i]] = i
+        for i in range(len(self.heap) // 2 - 1, -1, -1):
+            self._sift_down(i)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def _above(self, a, b):
+        # True if task a belongs above task b.
+        va, vb = self.values[a], self.values[b]
+        return va > vb or (va == vb and self.order[a] < self.order[b])
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i]] = i
+        self.position[heap[j]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._above(self.heap[i], self.heap[parent]):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        n = len(self.heap)
+        while True:
+            best = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and self._above(self.heap[child], self.heap[best]):
+                    best = child
+            if best == i:
+                break
+            self._swap(i, best)
+            i = best
+
+    def update(self, name, value):
+        """
+        Sets the value of a task, adding it if it's new.
+        """
+        if name not in self.values:
+            self.values[name] = value
+            self.order[name] = len(self.order)
+            self.position[name] = len(self.heap)
+            self.heap.append(name)
+            self._sift_up(len(self.heap) - 1)
+            return
+        old = self.values[name]
+        self.values[name] = value
+        if value > old: self._sift_up(self.position[name])
+        elif value < old: self._sift_down(self.position[name])
+
+    def peek(self):
+        return self.heap[0]
+
+    def top_k(self, k):
+        """
+        Returns the k best (task, value) pairs, best first, in O(k log k).
+        """
+        result = []
+        if not self.heap:
+            return result
+        candidates = [(-self.values[self.heap[0]], self.order[self.heap[0]], 0)]
+        while candidates and len(result) < k:
+            value, _, i = heapq.heappop(candidates)
+            result.append((self.heap[i], -value))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    name = self.heap[child]
+                    heapq.heappush(candidates, (-self.values[name], self.order[name], child))
+        return result